@@ -1,14 +1,37 @@
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import itertools
+import json
+import queue
+import secrets
+import threading
+import time
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from ..database import get_db
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from ..config import settings
+from ..database import get_db, get_session_factory
 from ..schemas import ProviderSearchResponse, QuestionRequest, QuestionResponse
-from ..services.database_service import DatabaseService
+from ..services.database_service import DatabaseService, QueryRejectedError
 from ..services.openai_service import OpenAIService
+from ..services.intent_service import cached_intent_matcher, get_intent_matcher, intent_stats
+from ..services.zip_neighbor_service import ZipNeighborService
+from ..tracing import sample_stacks, span
 
 router = APIRouter()
 
+# radius_filter is ZipNeighborService.radius_filter, scripts/benchmark_zip_neighbors.py times both forms
+PROVIDER_SEARCH_SQL = """
+SELECT p.provider_id, p.provider_name, pp.averaged_covered_charges
+FROM provider p
+JOIN provider_pricing pp ON p.provider_id = pp.provider_id
+WHERE pp.ms_drg_definition ILIKE :drg_description
+and {radius_filter}
+ORDER BY pp.averaged_covered_charges, p.provider_id
+"""
+
 @router.get("/providers", response_model=List[ProviderSearchResponse])
 async def search_providers(
     drg_description: Optional[str] = Query(None),
@@ -22,43 +45,114 @@ async def search_providers(
 
     try:
         db_service = DatabaseService(db)
+        neighbor_service = ZipNeighborService(db)
+
+        # Build query based on parameters, small radii are served from the
+        # precomputed nearest-provider list
+        with span("sql"):
+            radius_filter = neighbor_service.radius_filter(zip_code, zip_code_radius_km)
 
-        # Build query based on parameters
-        # Zipcode radius searching is mocked.  Need geocode table or call to GoogleMaps for real
-        query = """
-        SELECT p.provider_id, p.provider_name, pp.averaged_covered_charges
-        FROM provider p
-        JOIN provider_pricing pp ON p.provider_id = pp.provider_id
-        WHERE pp.ms_drg_definition ILIKE :drg_description
-        and calculate_zip_distance(p.provider_zip_code, :zip_code) < :zip_code_radius_km
-        """
+        query = PROVIDER_SEARCH_SQL.format(radius_filter=radius_filter)
         params = {
             "drg_description": f"%{drg_description}%",
             "zip_code": zip_code,
             "zip_code_radius_km": zip_code_radius_km
         }
 
-        query += " ORDER BY pp.averaged_covered_charges, p.provider_id"
-
-        results = db_service.execute_safe_query(query, params)
+        with span("sql"):
+            results = db_service.execute_safe_query(query, params)
 
         if not results:
             return []
 
         # Convert results to response model
-        response = []
-        for result in results:
-            response.append(ProviderSearchResponse(
-                provider_id=result["provider_id"],
-                provider_name=result["provider_name"],
-                average_covered_charges=result.get("averaged_covered_charges")
-            ))
+        with span("pydantic"):
+            response = []
+            for result in results:
+                response.append(ProviderSearchResponse(
+                    provider_id=result["provider_id"],
+                    provider_name=result["provider_name"],
+                    average_covered_charges=result.get("averaged_covered_charges")
+                ))
 
         return response
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+# Table schemas given to OpenAI
+TABLE_SCHEMAS = {
+    "provider": [
+        "provider_id INT PRIMARY KEY",
+        "provider_name VARCHAR(255)",
+        "provider_city VARCHAR(255)",
+        "provider_state VARCHAR(2)",
+        "provider_zip_code VARCHAR(20)",
+        "provider_status VARCHAR(20)"
+    ],
+    "provider_pricing": [
+        "provider_id INT",
+        "ms_drg_definition VARCHAR(1000)",
+        "total_discharges INT",
+        "averaged_covered_charges INT",
+        "average_total_payments INT",
+        "average_medicare_payments INT",
+        "provider_pricing_year INT"
+    ],
+    "provider_rating": [
+        "provider_id INT",
+        "provider_overall_rating INT",
+        "provider_star_rating INT",
+        "provider_rating_year INT"
+    ]
+}
+
+ANSWER_ROW_LIMIT = 10
+STREAM_FETCH_SIZE = 100
+STREAM_QUEUE_SIZE = 2
+STREAM_PUT_TIMEOUT_SECONDS = 0.5
+
+OFF_TOPIC_ANSWER = " I can only help with hospital pricing and quality information. Please ask about medical procedures, costs, or hospital ratings."
+REJECTED_ANSWER = "That question needs too large a search to answer quickly. Please ask a more specific question."
+ERROR_ANSWER = "I had a problem finding an answer for you. Please try again."
+NO_RESULTS_ANSWER = "I didn't find any hospital pricing or quality information for your question.  Please ask another question"
+
+def _format_result(index: int, result: dict) -> str:
+    return f"{index + 1}. {result}\n"
+
+def _more_results(count: int) -> str:
+    return f"... and {count - ANSWER_ROW_LIMIT} more results."
+
+async def _resolve_query(question: str, db: Session) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Return SQL and params for a question, matching common templates locally before asking OpenAI"""
+    start = time.perf_counter()
+    try:
+        with span("intent_match"):
+            # The vocabulary reload queries the database, keep it off the event loop
+            matcher = cached_intent_matcher() or await asyncio.to_thread(get_intent_matcher, db)
+            match = matcher.match(question)
+            sql_query = match.resolve_sql(db) if match else None
+    except Exception as e:
+        print(f"Intent matching error: {e}")
+        # A failed query aborts the transaction, roll back so the fallback query can run
+        db.rollback()
+        match = None
+    intent_stats.record_match(match is not None, time.perf_counter() - start)
+
+    if match:
+        return sql_query, match.params
+
+    start = time.perf_counter()
+    with span("openai"):
+        sql_query = await OpenAIService().convert_to_sql(question, TABLE_SCHEMAS)
+    intent_stats.record_llm_call(time.perf_counter() - start)
+    return sql_query, {}
+
+@router.get("/ask/stats")
+async def ask_stats():
+    """Template match rate and the OpenAI latency saved by the local fast path"""
+    return intent_stats.report()
+
 @router.post("/ask", response_model=QuestionResponse)
 async def ask_question(
     request: QuestionRequest,
@@ -68,70 +162,161 @@ async def ask_question(
 
     try:
         # Initialize services
-        openai_service = OpenAIService()
         db_service = DatabaseService(db)
 
-        # Define table schemas for OpenAI
-        table_schemas = {
-            "provider": [
-                "provider_id INT PRIMARY KEY",
-                "provider_name VARCHAR(255)",
-                "provider_city VARCHAR(255)",
-                "provider_state VARCHAR(2)",
-                "provider_zip_code VARCHAR(20)",
-                "provider_status VARCHAR(20)"
-            ],
-            "provider_pricing": [
-                "provider_id INT",
-                "ms_drg_definition VARCHAR(1000)",
-                "total_discharges INT",
-                "averaged_covered_charges INT",
-                "average_total_payments INT",
-                "average_medicare_payments INT",
-                "provider_pricing_year INT"
-            ],
-            "provider_rating": [
-                "provider_id INT",
-                "provider_overall_rating INT",
-                "provider_star_rating INT",
-                "provider_rating_year INT"
-            ]
-        }
-
         # Convert natural language to SQL
-        sql_query = await openai_service.convert_to_sql(request.question, table_schemas)
+        sql_query, params = await _resolve_query(request.question, db)
 
         if not sql_query:
-            return QuestionResponse(
-                answer=" I can only help with hospital pricing and quality information. Please ask about medical procedures, costs, or hospital ratings.",
-            )
+            return QuestionResponse(answer=OFF_TOPIC_ANSWER)
 
-        # Execute the query
-        results = db_service.execute_safe_query(sql_query)
+        # Execute the query, generated SQL is untrusted so it runs read-only behind a cost check
+        try:
+            with span("sql"):
+                results = db_service.execute_guarded_query(sql_query, params)
+        except QueryRejectedError:
+            return QuestionResponse(answer=REJECTED_ANSWER)
 
         if results is None:
-            return QuestionResponse(
-                answer="I had a problem finding an answer for you. Please try again.",
-            )
+            return QuestionResponse(answer=ERROR_ANSWER)
 
         if not results:
-            return QuestionResponse(
-                answer="I didn't find any hospital pricing or quality information for your question.  Please ask another question"
-            )
+            return QuestionResponse(answer=NO_RESULTS_ANSWER)
 
         # Format results for response
-        # answer = f"Found {len(results)} result(s):\n"
-        answer = ""
-        for i, result in enumerate(results[:10]):  # Limit to 10 results
-            answer += f"{i+1}. {result}\n"
+        with span("format"):
+            lines = [_format_result(i, result) for i, result in enumerate(results[:ANSWER_ROW_LIMIT])]
+
+            if len(results) > ANSWER_ROW_LIMIT:
+                lines.append(_more_results(len(results)))
 
-        if len(results) > 10:
-            answer += f"... and {len(results) - 10} more results."
+        with span("pydantic"):
+            response = QuestionResponse(answer="".join(lines))
 
-        return QuestionResponse(
-           answer=answer
-        )
         return response
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Service error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Service error: {str(e)}")
+
+def _next_batch(rows: Iterator[dict]) -> List[dict]:
+    return list(itertools.islice(rows, STREAM_FETCH_SIZE))
+
+def _produce_batches(db: Session, sql_query: str, params: Dict[str, Any],
+                     batches: queue.Queue, stop: threading.Event):
+    """Run the whole cursor loop in one thread, handing batches to the stream through a bounded queue
+
+    The thread owns the session from the moment it starts and closes it when done,
+    so a client disconnect never closes the session while a fetch is in progress.
+    An exception is handed over in place of a batch.
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=STREAM_PUT_TIMEOUT_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    rows = DatabaseService(db).stream_guarded_query(sql_query, params, batch_size=STREAM_FETCH_SIZE)
+    try:
+        while True:
+            batch = _next_batch(rows)
+            if not put(batch) or len(batch) < STREAM_FETCH_SIZE:
+                break
+    except Exception as e:
+        put(e)
+    finally:
+        try:
+            # Ends the savepoint on this thread
+            rows.close()
+        finally:
+            db.close()
+            # Wakes a reader still waiting after the stream stopped early
+            try:
+                batches.put_nowait([])
+            except queue.Full:
+                pass
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: QuestionRequest,
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
+):
+    """Streaming /ask, answers as Server-Sent Events while the query runs
+
+    Events are status (SQL generated), row (one formatted result line), answer
+    (a complete answer when there are no rows to stream), error and done.
+    """
+
+    async def events():
+        try:
+            # Dependencies are closed before the body is sent, so the stream owns its session
+            db = session_factory()
+            producer_started = False
+            stop = threading.Event()
+            try:
+                sql_query, params = await _resolve_query(request.question, db)
+
+                if not sql_query:
+                    yield _sse("answer", {"answer": OFF_TOPIC_ANSWER})
+                    return
+
+                yield _sse("status", {"stage": "sql_generated"})
+
+                # From here on the session belongs to the producer thread
+                batches = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+                threading.Thread(
+                    target=_produce_batches, args=(db, sql_query, params, batches, stop), daemon=True
+                ).start()
+                producer_started = True
+                count = 0
+                while True:
+                    batch = await asyncio.to_thread(batches.get)
+                    if isinstance(batch, Exception):
+                        raise batch
+                    for result in batch:
+                        if count < ANSWER_ROW_LIMIT:
+                            yield _sse("row", {"text": _format_result(count, result)})
+                        count += 1
+                    if len(batch) < STREAM_FETCH_SIZE:
+                        break
+            except QueryRejectedError:
+                yield _sse("answer", {"answer": REJECTED_ANSWER})
+                return
+            finally:
+                # On a client disconnect the producer stops after its current fetch and closes the session
+                stop.set()
+                if not producer_started:
+                    db.close()
+
+            if count == 0:
+                yield _sse("answer", {"answer": NO_RESULTS_ANSWER})
+            elif count > ANSWER_ROW_LIMIT:
+                yield _sse("row", {"text": _more_results(count)})
+
+            yield _sse("done", {"total_rows": count})
+
+        except Exception as e:
+            print(f"Streaming answer error: {e}")
+            yield _sse("error", {"answer": ERROR_ANSWER})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.post("/admin/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=60),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Sample the stacks of this worker for a number of seconds and return collapsed stacks for a flamegraph"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    # Sampling runs in a thread so the event loop, and the requests it serves, are captured
+    return await asyncio.to_thread(sample_stacks, seconds)
@@ -1,9 +1,28 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import Tuple
 from .config import settings
 
-engine = create_engine(settings.database_url)
+def worker_connection_limit() -> int:
+    """Connections one worker may hold so that all workers together stay within the database limit"""
+    available = settings.db_max_connections - settings.db_reserved_connections
+    return max(1, available // max(1, settings.web_concurrency))
+
+def worker_pool_sizes() -> Tuple[int, int]:
+    """Pool size and max overflow of one worker, DB_POOL_SIZE plus up to DB_MAX_OVERFLOW within its share"""
+    limit = worker_connection_limit()
+    pool_size = min(settings.db_pool_size, limit)
+    return pool_size, min(settings.db_max_overflow, limit - pool_size)
+
+_pool_size, _max_overflow = worker_pool_sizes()
+
+# create_engine does not connect, the pool is filled on first use or by warm_pool
+engine = create_engine(
+    settings.database_url,
+    pool_size=_pool_size,
+    max_overflow=_max_overflow
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -13,4 +32,29 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_session_factory():
+    """Dependency for streaming endpoints, which must open their own session
+
+    Dependencies with yield are closed before a StreamingResponse body is sent, so a
+    session from get_db cannot be used while streaming.
+    """
+    return SessionLocal
+
+def create_schema():
+    """Create any missing tables.  Run as an explicit migration step, not at app import"""
+    from . import models  # noqa: F401 - registers the tables on Base.metadata
+    Base.metadata.create_all(bind=engine)
+
+def warm_pool():
+    """Open the pool's connections up front so the first requests don't pay for connecting"""
+    connections = []
+    try:
+        for _ in range(engine.pool.size()):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
@@ -1,23 +1,83 @@
+import asyncio
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from .api.endpoints import router
-from .database import engine, Base
+from fastapi.responses import JSONResponse
+from .api.endpoints import router, TABLE_SCHEMAS
+from .config import settings
+from .database import SessionLocal, engine, warm_pool
+from .services.intent_service import get_intent_matcher
+from .services.openai_service import OpenAIService, get_client
+from .tracing import trace_requests
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema creation is an explicit migration step: python scripts/migrate.py
+
+WARM_UP_RETRY_SECONDS = 5
+
+def warm_caches():
+    """Build the OpenAI schema prompt and load the DRG and location vocabulary used by the /ask fast path"""
+    OpenAIService()._format_schemas(TABLE_SCHEMAS)
+
+    db = SessionLocal()
+    try:
+        get_intent_matcher(db)
+    finally:
+        db.close()
+
+async def warm_up(app: FastAPI):
+    """Warm the connection pool, caches and clients in the background, then mark the app ready"""
+    while not app.state.ready:
+        try:
+            await asyncio.to_thread(warm_pool)
+            await asyncio.to_thread(warm_caches)
+            if settings.openai_api_key:
+                get_client()
+            app.state.ready = True
+        except Exception as e:
+            print(f"Warm up failed, retrying in {WARM_UP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    warm_up_task = asyncio.create_task(warm_up(app))
+
+    # uvicorn does not route requests to a worker until startup returns, so waiting here
+    # means multi-worker deployments only accept traffic once warm
+    if settings.warm_up_timeout_seconds > 0:
+        try:
+            await asyncio.wait_for(asyncio.shield(warm_up_task), timeout=settings.warm_up_timeout_seconds)
+        except asyncio.TimeoutError:
+            print(f"Warm up not finished after {settings.warm_up_timeout_seconds}s, continuing in the background")
+
+    yield
+    warm_up_task.cancel()
+    engine.dispose()
 
 app = FastAPI(
     title="Healthcare Cost Provider API",
     description="API for providing healthcare provider data with natural language queries",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.include_router(router, prefix="/api/v1")
 
+# Not installed at all when disabled, so spans stay no-ops without a per-request cost
+if settings.slow_request_ms > 0:
+    app.middleware("http")(trace_requests)
+
 @app.get("/")
 async def root():
     return {"message": "Healthcare Cost Provider API"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe, unlike /health this fails until warm up has finished"""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, REAL, DateTime, ForeignKey, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -38,4 +38,39 @@ class ProviderRating(Base):
     provider_star_rating = Column(Integer, default=0)
     provider_rating_year = Column(Integer)
 
-    provider = relationship("Provider", back_populates="rating")
\ No newline at end of file
+    provider = relationship("Provider", back_populates="rating")
+
+class ZipCodeCentroid(Base):
+    __tablename__ = "zip_code_centroid"
+
+    zip_code = Column(String(20), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+
+class ProviderZipNeighbor(Base):
+    __tablename__ = "provider_zip_neighbor"
+
+    # K nearest providers per zip code, rebuilt by ZipNeighborService.precompute
+    zip_code = Column(String(20), primary_key=True)
+    neighbor_rank = Column(SmallInteger, primary_key=True)
+    provider_id = Column(Integer, ForeignKey("provider.provider_id"), nullable=False)
+    distance_km = Column(REAL, nullable=False)
+
+
+class ZipNeighborBuild(Base):
+    __tablename__ = "zip_neighbor_build"
+
+    # K each neighbor table was last built with, checked by ZipNeighborService.covers_radius
+    table_name = Column(String(63), primary_key=True)
+    k = Column(Integer, nullable=False)
+    built_at = Column(DateTime, server_default=func.now())
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoint"
+
+    # Rows of file already committed from source, written with each import batch
+    source = Column(String(1000), primary_key=True)
+    file = Column(String(255), primary_key=True)
+    row_offset = Column(Integer, nullable=False, default=0)
+    total_rows = Column(Integer)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
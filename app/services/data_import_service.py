@@ -2,99 +2,304 @@
 import requests
 import zipfile
 import io
-import csv
 import json
-from typing import List, Dict, Any, Optional
+import os
+import csv
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict, Any, NamedTuple, Optional, TextIO, Union
+
+import numpy as np
+import pandas as pd
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+CSV_CHUNK_SIZE = 50000
+
+FIELD_MAPPINGS = {
+    "facility id": "provider_id",
+    "rndrng_prvdr_ccn": "provider_id",
+    "facility name": "provider_name",
+    "rndrng_prvdr_org_name": "provider_name",
+    "address": "provider_address",
+    "rndrng_prvdr_st": "provider_address",
+    "city/town": "provider_city",
+    "rndrng_prvdr_city": "provider_city",
+    "state": "provider_state",
+    "rndrng_prvdr_state_abrvtn": "provider_state",
+    "zip code": "provider_zip_code",
+    "rndrng_prvdr_zip5": "provider_zip_code",
+    "drg_cd": "ms_drg_code",
+    "drg_desc": "ms_drg_definition",
+    "tot_dschrgs": "total_discharges",
+    "avg_submtd_cvrd_chrg": "averaged_covered_charges",
+    "avg_tot_pymt_amt": "average_total_payments",
+    "avg_mdcr_pymt_amt": "average_medicare_payments",
+    "hospital overall rating": "provider_overall_rating",
+    "patient survey star rating": "provider_star_rating"
+}
+
+# Pricing amounts are stored as whole dollars, see DatabaseService._import_pricing_data
+TRUNCATED_NUMERIC_FIELDS = ["averaged_covered_charges", "average_total_payments", "average_medicare_payments"]
+
+class ProcessedFile(NamedTuple):
+    file: str
+    rows: int
+    # Read lazily from a JSON Lines file, None when the file could not be processed
+    records: Optional[Iterator[Dict[str, Any]]]
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of the current process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _read_json_lines(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            yield json.loads(line)
+
+def _extract_zip_member(zip_path: str, subfile: str, output_path: str) -> Dict[str, float]:
+    """Stream one CSV member of a ZIP file through the CSV parser into a JSON Lines file.
+
+    Runs in a worker process, so the reported peak RSS belongs to this member only.
+    Only the stats are sent back, the records stay on disk until the importer reads them.
+    """
+    start = time.perf_counter()
+
+    with zipfile.ZipFile(zip_path) as zip_file:
+        with zip_file.open(subfile) as file, open(output_path, 'w', encoding='utf-8') as output:
+            # Decodes incrementally as the CSV reader pulls lines from the member
+            text_stream = io.TextIOWrapper(file, encoding='utf-8', newline='')
+            rows = DataImportService()._write_json_records(text_stream, output, lines=True)
+
+    return {
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+    }
 
 class DataImportService:
 
     def fetch_and_process_file(self, url: str, filename: str, file_extension: str,
-                              file_type: str, subfiles: List[str] = None) -> List[str]:
-        """Fetch file from URL and process it"""
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+                              file_type: str, subfiles: List[str] = None) -> Iterator[ProcessedFile]:
+        """Fetch file from URL and process it
 
+        Yields one ProcessedFile at a time.  Its records are read from a temporary JSON
+        Lines file while the caller imports them, so no file is held in memory whole.
+        The temporary file is removed once the caller moves on to the next file.
+        """
+        try:
             if file_type.upper() == "ZIP" and subfiles:
-                return self._process_zip_file(response.content, subfiles)
-            elif file_extension.lower() == "csv":
-                return [self._csv_to_json(response.text)]
-            else:
+                # Spool the archive to disk instead of holding it in memory
+                with tempfile.NamedTemporaryFile(suffix=".zip") as zip_file:
+                    self._download(url, zip_file)
+                    yield from self._process_zip_file(zip_file.name, subfiles)
+                return
+
+            if file_extension.lower() != "csv":
                 raise ValueError("Unsupported file type")
 
+            with tempfile.TemporaryDirectory() as output_dir:
+                csv_path = os.path.join(output_dir, filename)
+                output_path = os.path.join(output_dir, "records.jsonl")
+                with open(csv_path, 'wb') as csv_file:
+                    self._download(url, csv_file)
+                with open(csv_path, encoding='utf-8', newline='') as csv_file, \
+                        open(output_path, 'w', encoding='utf-8') as output:
+                    rows = self._write_json_records(csv_file, output, lines=True)
+                os.remove(csv_path)
+
+                yield ProcessedFile(filename, rows, _read_json_lines(output_path))
+
         except Exception as e:
             print(f"Error fetching file from {url}: {e}")
-            return []
 
-    def _process_zip_file(self, zip_content: bytes, subfiles: List[str]) -> List[str]:
-        """Process ZIP file and extract specified subfiles"""
+    def fetch_zip_centroids(self, url: str, member: str) -> List[Dict[str, Any]]:
+        """Fetch a Census ZCTA gazetteer archive and return the zip code centroids in member"""
         try:
-            json_results = []
+            with tempfile.NamedTemporaryFile(suffix=".zip") as zip_file:
+                self._download(url, zip_file)
+                with zipfile.ZipFile(zip_file.name) as archive:
+                    with archive.open(member) as file:
+                        return self._gazetteer_to_centroids(io.TextIOWrapper(file, encoding='utf-8', newline=''))
 
-            with zipfile.ZipFile(io.BytesIO(zip_content)) as zip_file:
+        except Exception as e:
+            print(f"Error fetching zip code centroids from {url}: {e}")
+            return []
+
+    def _gazetteer_to_centroids(self, gazetteer: TextIO) -> List[Dict[str, Any]]:
+        """Parse a tab separated gazetteer file into zip_code, latitude and longitude"""
+        reader = csv.reader(gazetteer, delimiter='\t')
+        # The last gazetteer header carries trailing whitespace
+        header = [column.strip().upper() for column in next(reader)]
+        zip_index = header.index("GEOID")
+        latitude_index = header.index("INTPTLAT")
+        longitude_index = header.index("INTPTLONG")
+
+        centroids = []
+        for row in reader:
+            if not row:
+                continue
+            centroids.append({
+                "zip_code": row[zip_index].strip(),
+                "latitude": float(row[latitude_index]),
+                "longitude": float(row[longitude_index]),
+            })
+        return centroids
+
+    def _download(self, url: str, file):
+        """Stream url into an open binary file in chunks"""
+        with requests.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+        file.flush()
+
+    def _process_zip_file(self, zip_path: str, subfiles: List[str],
+                          max_workers: Optional[int] = None) -> Iterator[ProcessedFile]:
+        """Process ZIP file on disk and extract specified subfiles in worker processes
+
+        Yields a ProcessedFile per subfile in subfiles order, its records are None for a
+        subfile that is missing or failed to convert.  Other subfiles are still processed.
+        """
+        with zipfile.ZipFile(zip_path) as zip_file:
+            names = set(zip_file.namelist())
+
+        members = list(dict.fromkeys(
+            subfile for subfile in subfiles if subfile in names and subfile.lower().endswith('.csv')
+        ))
+        workers = max_workers or min(len(members), os.cpu_count() or 1) or 1
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            # One task per worker process so ru_maxrss is the peak of a single member
+            with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+                output_paths = {member: os.path.join(output_dir, f"{index}.jsonl") for index, member in enumerate(members)}
+                futures = {
+                    member: executor.submit(_extract_zip_member, zip_path, member, output_path)
+                    for member, output_path in output_paths.items()
+                }
+
+                # Results keep the subfiles order, later files may depend on earlier ones
                 for subfile in subfiles:
-                    if subfile in zip_file.namelist():
-                        with zip_file.open(subfile) as file:
-                            if subfile.lower().endswith('.csv'):
-                                content = file.read().decode('utf-8')
-                                json_results.append(self._csv_to_json(content))
-                            else:
-                                print(f"Skipping non-CSV file: {subfile}")
+                    if subfile not in names:
+                        print(f"Subfile not found in ZIP: {subfile}")
+                        yield ProcessedFile(subfile, 0, None)
+                        continue
+                    if subfile not in futures:
+                        print(f"Skipping non-CSV file: {subfile}")
+                        continue
 
-            return json_results
+                    try:
+                        stats = futures[subfile].result()
+                    except Exception as e:
+                        print(f"Error processing {subfile}: {e}")
+                        yield ProcessedFile(subfile, 0, None)
+                        continue
 
-        except Exception as e:
-            print(f"Error processing ZIP file: {e}")
-            return []
+                    print(f"Processed {subfile}: {stats['rows']} rows in {stats['seconds']:.1f}s, "
+                          f"worker peak RSS {stats['peak_rss_mb']:.0f} MB")
+                    yield ProcessedFile(subfile, stats['rows'], _read_json_lines(output_paths[subfile]))
 
-    def _csv_to_json(self, csv_content: str) -> str:
-        """Convert CSV content to JSON with field mappings"""
+    def _csv_to_json(self, csv_content: Union[str, TextIO]) -> str:
+        """Convert CSV content, either a string or a text stream, to JSON with field mappings"""
         try:
-            csv_reader = csv.DictReader(io.StringIO(csv_content))
-            json_objects = []
-
-            field_mappings = {
-                "facility id": "provider_id",
-                "rndrng_prvdr_ccn": "provider_id",
-                "facility name": "provider_name",
-                "rndrng_prvdr_org_name": "provider_name",
-                "address": "provider_address",
-                "rndrng_prvdr_st": "provider_address",
-                "city/town": "provider_city",
-                "rndrng_prvdr_city": "provider_city",
-                "state": "provider_state",
-                "rndrng_prvdr_state_abrvtn": "provider_state",
-                "zip code": "provider_zip_code",
-                "rndrng_prvdr_zip5": "provider_zip_code",
-                "drg_cd": "ms_drg_code",
-                "drg_desc": "ms_drg_definition",
-                "tot_dschrgs": "total_discharges",
-                "avg_submtd_cvrd_chrg": "averaged_covered_charges",
-                "avg_tot_pymt_amt": "average_total_payments",
-                "avg_mdcr_pymt_amt": "average_medicare_payments",
-                "hospital overall rating": "provider_overall_rating",
-                "patient survey star rating": "provider_star_rating"
-            }
-
-            for row in csv_reader:
-                # Skip rows based on specified criteria
-                if self._should_skip_row(row):
-                    continue
-
-                # Map field names
-                mapped_row = {}
-                for original_key, value in row.items():
-                    mapped_key = field_mappings.get(original_key.lower(), original_key)
-                    mapped_row[mapped_key] = value
-
-                json_objects.append(mapped_row)
-
-            return json.dumps(json_objects)
+            if isinstance(csv_content, str):
+                csv_content = io.StringIO(csv_content)
+
+            output = io.StringIO()
+            self._write_json_records(csv_content, output)
+            return output.getvalue()
 
         except Exception as e:
             print(f"Error converting CSV to JSON: {e}")
             return "[]"
 
+    def _write_json_records(self, csv_content: TextIO, output: TextIO, lines: bool = False) -> int:
+        """Write CSV records to output with field mappings, returns the number of records
+
+        Records are written as one JSON array, or as JSON Lines with lines=True.  Rows
+        are read in chunks into DataFrames so renaming, skip rules and numeric coercion
+        run as column operations instead of per-row Python code, and each chunk is
+        written out before the next one is read.
+        """
+        # Read the header ourselves so pandas doesn't rename repeated headers to "name.1",
+        # like csv.DictReader the last column with a name wins
+        header = next(csv.reader([csv_content.readline()]), [])
+        if not header:
+            if not lines:
+                output.write("[]")
+            return 0
+
+        columns = pd.Index([FIELD_MAPPINGS.get(column.lower(), column) for column in header])
+        keep = ~columns.duplicated(keep='last')
+
+        # Unlike csv.DictReader, fields missing from short rows are "" rather than null
+        # and rows longer than the header are skipped with a warning instead of failing the file
+        chunks = pd.read_csv(csv_content, header=None, names=range(len(header)), index_col=False,
+                             dtype=str, keep_default_na=False, chunksize=CSV_CHUNK_SIZE,
+                             on_bad_lines='warn')
+
+        if not lines:
+            output.write("[")
+        rows = 0
+        for chunk in chunks:
+            chunk.columns = header
+
+            # Skip rows based on specified criteria
+            chunk = chunk[~self._skip_row_mask(chunk)]
+            if chunk.empty:
+                continue
+
+            # Map field names, the last of any columns mapping to the same field wins
+            chunk.columns = columns
+            chunk = chunk.loc[:, keep]
+
+            for field in TRUNCATED_NUMERIC_FIELDS:
+                if field in chunk.columns:
+                    chunk[field] = self._truncate_numeric(chunk[field])
+
+            if lines:
+                output.write(chunk.to_json(orient='records', lines=True))
+            else:
+                # Strip the brackets so chunks join into one JSON array
+                if rows:
+                    output.write(",")
+                output.write(chunk.to_json(orient='records')[1:-1])
+            rows += len(chunk)
+
+        if not lines:
+            output.write("]")
+        return rows
+
+    def _truncate_numeric(self, values: pd.Series) -> pd.Series:
+        """Truncate numeric strings to integers, leaving values that are not numbers unchanged
+
+        inf and values outside the int64 range are left unchanged as well, one of
+        them would otherwise make the cast fail for the whole chunk.
+        """
+        numbers = pd.to_numeric(values, errors='coerce')
+        convertible = np.isfinite(numbers) & (numbers.abs() < 2.0 ** 63)
+        truncated = np.trunc(numbers.where(convertible)).astype('Int64').astype(object)
+        return truncated.where(convertible, values)
+
+    def _skip_row_mask(self, chunk: pd.DataFrame) -> pd.Series:
+        """Vectorized _should_skip_row, True for every row that should be skipped"""
+        mask = pd.Series(False, index=chunk.index)
+
+        # Check hospital overall rating and patient survey star rating
+        for column in ("Hospital overall rating", "Patient Survey Star Rating"):
+            if column in chunk.columns:
+                values = chunk[column].fillna("")
+                mask |= (values != "") & ~values.str.isdigit()
+
+        # Check HCAHPS answer description
+        if "HCAHPS Answer Description" in chunk.columns:
+            values = chunk["HCAHPS Answer Description"].fillna("")
+            mask |= ((values != "") & ~values.str.isdigit()
+                     & (values.str.lower() != "summary star rating"))
+
+        return mask
+
     def _should_skip_row(self, row: Dict[str, Any]) -> bool:
         """Check if row should be skipped based on criteria"""
         # Check hospital overall rating
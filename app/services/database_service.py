@@ -1,11 +1,61 @@
+import itertools
 import math
+import time
 
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 import json
+from ..config import settings
 from ..models import Provider, ProviderPricing, ProviderRating
 
+IMPORT_BATCH_SIZE = 1000
+PROGRESS_INTERVAL_SECONDS = 10
+
+class QueryRejectedError(Exception):
+    """Raised when the plan of an untrusted query exceeds the configured cost or row limits"""
+
+class ImportProgress:
+    """Prints rows/sec and an ETA for one file at most every PROGRESS_INTERVAL_SECONDS"""
+
+    def __init__(self, file: str, total_rows: int):
+        self.file = file
+        self.total_rows = total_rows
+        self.rows_done = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def update(self, rows: int):
+        self.rows_done += rows
+        now = time.monotonic()
+        if now - self.last_report >= PROGRESS_INTERVAL_SECONDS:
+            self.last_report = now
+            self._report(now)
+
+    def finish(self):
+        self._report(time.monotonic())
+
+    def _report(self, now: float):
+        elapsed = now - self.started
+        rate = self.rows_done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total_rows - self.rows_done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+        print(f"{self.file}: {self.rows_done}/{self.total_rows} rows, {rate:.0f} rows/sec, ETA {eta}")
+
+def single_statement(query: str) -> str:
+    """Return query without one trailing semicolon, raising ValueError if it has several statements
+
+    EXPLAIN only covers the first statement while the driver runs all of them, so
+    untrusted SQL must be one statement.  Semicolons inside string literals are
+    rejected as well, erring on the safe side.
+    """
+    statement = query.strip()
+    if statement.endswith(";"):
+        statement = statement[:-1].rstrip()
+    if ";" in statement:
+        raise ValueError("Only a single SQL statement is allowed")
+    return statement
+
 class DatabaseService:
     def __init__(self, db: Session):
         self.db = db
@@ -29,6 +79,86 @@ class DatabaseService:
             print(f"Database query error: {e}")
             return None
 
+    def execute_guarded_query(self, query: str, params: Dict[str, Any] = None) -> Optional[List[Dict]]:
+        """Execute an untrusted query read-only, with a statement timeout and an EXPLAIN cost check
+
+        Runs inside a savepoint that is always rolled back, so the read-only mode and
+        timeout never leak into the rest of the session.  Raises QueryRejectedError when
+        the planner estimates exceed the configured limits.
+        """
+        if params is None:
+            params = {}
+
+        try:
+            query = single_statement(query)
+            savepoint = self._begin_guarded_query(query, params)
+            try:
+                result = self.db.execute(text(query), params)
+                if result.returns_rows:
+                    columns = result.keys()
+                    rows = result.fetchall()
+                    return [dict(zip(columns, row)) for row in rows]
+                else:
+                    return []
+            finally:
+                savepoint.rollback()
+
+        except QueryRejectedError:
+            raise
+        except Exception as e:
+            print(f"Guarded query error: {e}")
+            return None
+
+    def stream_guarded_query(self, query: str, params: Dict[str, Any] = None,
+                             batch_size: int = 100) -> Iterator[Dict]:
+        """Streaming execute_guarded_query, yields rows as the server-side cursor returns them
+
+        Unlike execute_guarded_query, database errors are raised to the caller since
+        rows may already have been consumed.
+        """
+        if params is None:
+            params = {}
+
+        query = single_statement(query)
+        savepoint = self._begin_guarded_query(query, params)
+        try:
+            result = self.db.execute(text(query).execution_options(yield_per=batch_size), params)
+            if result.returns_rows:
+                columns = list(result.keys())
+                for row in result:
+                    yield dict(zip(columns, row))
+        finally:
+            savepoint.rollback()
+
+    def _begin_guarded_query(self, query: str, params: Dict[str, Any]):
+        """Open a read-only savepoint with a statement timeout and check the query plan"""
+        savepoint = self.db.begin_nested()
+        try:
+            self.db.execute(text("SET TRANSACTION READ ONLY"))
+            self.db.execute(text("SELECT set_config('statement_timeout', :timeout, true)"),
+                            {"timeout": str(settings.query_statement_timeout_ms)})
+
+            self._check_query_plan(query, params)
+            return savepoint
+
+        except Exception:
+            savepoint.rollback()
+            raise
+
+    def _check_query_plan(self, query: str, params: Dict[str, Any]):
+        """Reject the query if EXPLAIN, without ANALYZE, estimates too much work"""
+        plan = self.db.execute(text(f"EXPLAIN (FORMAT JSON) {query}"), params).scalar()
+        top_node = plan[0]["Plan"]
+        total_cost = top_node["Total Cost"]
+        plan_rows = top_node["Plan Rows"]
+
+        if total_cost > settings.max_query_cost or plan_rows > settings.max_query_rows:
+            print(f"Rejected query plan, cost {total_cost} rows {plan_rows}: {query}")
+            raise QueryRejectedError(
+                f"Estimated cost {total_cost:.0f} and rows {plan_rows} exceed the limits "
+                f"of {settings.max_query_cost:.0f} and {settings.max_query_rows:.0f}"
+            )
+
     def calculate_zip_distance(self, zip1: str, zip2: str) -> Optional[float]:
         """Calculate distance between two zip codes using PostGIS"""
         try:
@@ -43,27 +173,71 @@ class DatabaseService:
             print(f"Distance calculation error: {e}")
             return None
 
-    def import_json_data(self, json_strings: List[str]) -> bool:
-        """Import data from JSON strings into database tables"""
+    def import_json_data(self, json_strings: List[str], source: Optional[str] = None,
+                         files: Optional[List[str]] = None, batch_size: int = IMPORT_BATCH_SIZE,
+                         resume: bool = False) -> bool:
+        """Import data from JSON strings into database tables
+
+        Records are committed in batches.  When a source is given, the row offset of
+        each file is checkpointed in the same transaction as its batch, and resume=True
+        continues every file after its last committed row.
+        """
+        for index, json_str in enumerate(json_strings):
+            file = files[index] if files and index < len(files) else str(index)
+            try:
+                data = json.loads(json_str)
+            except json.JSONDecodeError as e:
+                print(f"Invalid JSON: {e}")
+                continue
+
+            if not self.import_records(data, len(data), source=source, file=file,
+                                       batch_size=batch_size, resume=resume):
+                return False
+        return True
+
+    def import_records(self, records: Iterable[Dict[str, Any]], total_rows: int,
+                       source: Optional[str] = None, file: str = "0",
+                       batch_size: int = IMPORT_BATCH_SIZE, resume: bool = False) -> bool:
+        """Import records of one file, reading at most one batch of them at a time
+
+        Like import_json_data, but records may be a lazy iterator so a large file is
+        never held in memory whole.
+        """
         try:
-            for json_str in json_strings:
-                try:
-                    data = json.loads(json_str)
+            records = iter(records)
+            row_offset = self._get_checkpoint(source, file) if source and resume else 0
+            if row_offset:
+                print(f"Resuming {file} at row {row_offset} of {total_rows}")
+                # Skipped records are still read, but only one at a time
+                for _ in itertools.islice(records, row_offset):
+                    pass
 
-                    for json_date in data:
-                        if 'provider_id' not in json_date:
-                            print(f"Skipping record without provider_id: {json_str[:100]}...")
-                            continue
+            progress = ImportProgress(file, total_rows - row_offset)
 
-                        self._import_provider_data(json_date)
-                        self._import_pricing_data(json_date)
-                        self._import_rating_data(json_date)
-                        self.db.commit()
+            batch_start = row_offset
+            while True:
+                batch = list(itertools.islice(records, batch_size))
+                if not batch:
+                    break
 
-                except json.JSONDecodeError as e:
-                    print(f"Invalid JSON: {e}")
-                    continue
+                for json_date in batch:
+                    if 'provider_id' not in json_date:
+                        print(f"Skipping record without provider_id: {str(json_date)[:100]}...")
+                        continue
 
+                    self._import_provider_data(json_date)
+                    self._import_pricing_data(json_date)
+                    self._import_rating_data(json_date)
+                    # Flush so later records in the batch see providers added here
+                    self.db.flush()
+
+                batch_start += len(batch)
+                if source:
+                    self._save_checkpoint(source, file, batch_start, total_rows)
+                self.db.commit()
+                progress.update(len(batch))
+
+            progress.finish()
             self.db.commit()
             return True
 
@@ -72,6 +246,22 @@ class DatabaseService:
             self.db.rollback()
             return False
 
+    def _get_checkpoint(self, source: str, file: str) -> int:
+        """Return the number of rows of file already committed from source"""
+        result = self.db.execute(text(
+            "SELECT row_offset FROM import_checkpoint WHERE source = :source AND file = :file"
+        ), {"source": source, "file": file}).first()
+        return result.row_offset if result else 0
+
+    def _save_checkpoint(self, source: str, file: str, row_offset: int, total_rows: int):
+        """Record the committed row offset, committed together with the batch it covers"""
+        self.db.execute(text("""
+        INSERT INTO import_checkpoint (source, file, row_offset, total_rows, updated_at)
+        VALUES (:source, :file, :row_offset, :total_rows, now())
+        ON CONFLICT (source, file) DO UPDATE
+        SET row_offset = EXCLUDED.row_offset, total_rows = EXCLUDED.total_rows, updated_at = now()
+        """), {"source": source, "file": file, "row_offset": row_offset, "total_rows": total_rows})
+
     def _import_provider_data(self, data: Dict[str, Any]):
         """Import provider data"""
         provider_fields = {
@@ -110,16 +300,11 @@ class DatabaseService:
                 pricing_data.pop('ms_drg_code')
 
             # These are temporary pending business clarification and should either be
-            # implemented more efficiently or stored in a decimal form of some precision
-            if 'averaged_covered_charges' in pricing_data:
-                averaged_covered_charges = math.trunc(float(pricing_data['averaged_covered_charges']))
-                pricing_data['averaged_covered_charges'] = averaged_covered_charges
-            if 'average_total_payments' in pricing_data:
-                average_total_payments = math.trunc(float(pricing_data['average_total_payments']))
-                pricing_data['average_total_payments'] = average_total_payments
-            if 'average_medicare_payments' in pricing_data:
-                average_medicare_payments = math.trunc(float(pricing_data['average_medicare_payments']))
-                pricing_data['average_medicare_payments'] = average_medicare_payments
+            # implemented more efficiently or stored in a decimal form of some precision.
+            # DataImportService already truncates these columns, only other sources need it here
+            for field in ('averaged_covered_charges', 'average_total_payments', 'average_medicare_payments'):
+                if field in pricing_data and not isinstance(pricing_data[field], int):
+                    pricing_data[field] = math.trunc(float(pricing_data[field]))
             pricing = ProviderPricing(**pricing_data)
             self.db.add(pricing)
 
@@ -0,0 +1,265 @@
+import re
+import threading
+import time
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from .zip_neighbor_service import ZipNeighborService
+
+VOCABULARY_TTL_SECONDS = 600
+NEAR_RADIUS_KM = 25
+MIN_DRG_WORD_LENGTH = 3
+
+# Words of a question that say nothing about the procedure, DRG phrases need at least one other word
+DRG_STOP_WORDS = {
+    "and", "any", "are", "care", "cost", "drg", "for", "from", "get", "getting", "have", "having",
+    "procedure", "the", "treat", "treating", "treatment"
+}
+
+# Severity qualifiers, "with mcc" and "without cc/mcc" name different DRGs of the same condition
+DRG_QUALIFIER_PATTERN = re.compile(r"\b(with|without|w/o|w)\s+(cc/mcc|cc or mcc|mcc|cc)\b")
+DRG_SEVERITY_PATTERN = re.compile(r"\b(?:cc|mcc)\b")
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "puerto rico": "PR", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY"
+}
+
+# Question templates, the named groups are validated against the vocabulary before use
+CHEAPEST_PATTERN = re.compile(
+    r"^(?:who|which|what)?\s*(?:hospital\s+|provider\s+)?(?:is\s+|has\s+)?(?:the\s+)?cheapest"
+    r"(?:\s+(?:hospital|provider))?\s+(?:for|to do)\s+(?P<drg>.+?)\s+"
+    r"(?:near|around|close to|within\s+(?P<radius>\d+(?:\.\d+)?)\s*km\s+of)\s+(?P<zip_code>\d{5})$"
+)
+BEST_RATED_PATTERN = re.compile(
+    r"^(?:who|which|what)?\s*(?:is\s+)?(?:the\s+)?(?:best|highest|top)[\s-]rated"
+    r"(?:\s+(?:hospital|provider))?\s+in\s+(?P<location>[a-z .'-]+)$"
+)
+AVERAGE_COST_PATTERN = re.compile(
+    r"^(?:what\s+is\s+|what's\s+)?(?:the\s+)?average\s+(?:cost|price|charge)\s+(?:of|for)\s+(?P<drg>.+?)"
+    r"\s+in\s+(?P<location>[a-z .'-]+)$"
+)
+
+CHEAPEST_SQL = """
+SELECT p.provider_id, p.provider_name, pp.ms_drg_definition, pp.averaged_covered_charges
+FROM provider p
+JOIN provider_pricing pp ON p.provider_id = pp.provider_id
+WHERE pp.ms_drg_definition = ANY(:drg_definitions)
+and {radius_filter}
+ORDER BY pp.averaged_covered_charges, p.provider_id
+LIMIT 1
+"""
+
+BEST_RATED_SQL = """
+SELECT p.provider_id, p.provider_name, MAX(pr.provider_overall_rating) AS provider_overall_rating
+FROM provider p
+JOIN provider_rating pr ON p.provider_id = pr.provider_id
+WHERE {location_filter}
+GROUP BY p.provider_id, p.provider_name
+ORDER BY provider_overall_rating DESC, p.provider_id
+LIMIT 1
+"""
+
+AVERAGE_COST_SQL = """
+SELECT ROUND(AVG(pp.averaged_covered_charges)) AS average_covered_charges
+FROM provider p
+JOIN provider_pricing pp ON p.provider_id = pp.provider_id
+WHERE pp.ms_drg_definition = ANY(:drg_definitions)
+and {location_filter}
+"""
+
+class IntentMatch(NamedTuple):
+    intent: str
+    sql: str
+    params: Dict[str, Any]
+
+    def resolve_sql(self, db: Session) -> str:
+        """Return the SQL to run, the cheapest template reads the precomputed nearest providers when they cover the radius"""
+        if self.intent == "cheapest_near_zip":
+            radius_filter = ZipNeighborService(db).radius_filter(
+                self.params["zip_code"], self.params["zip_code_radius_km"]
+            )
+            return self.sql.format(radius_filter=radius_filter)
+        return self.sql
+
+class IntentMatcher:
+    """Recognizes common /ask question templates and returns parameterized SQL for them
+
+    Questions that do not match a template, or mention a DRG or location missing
+    from the database, return None and are sent to OpenAI instead.
+    """
+
+    def __init__(self, drg_definitions: List[str], cities: List[str]):
+        self.drg_words = []
+        for drg in drg_definitions:
+            qualifiers, rest = _split_qualifiers(drg)
+            self.drg_words.append((drg, qualifiers[0] if qualifiers else None, set(_drg_words(rest))))
+        self.cities = {city.lower() for city in cities}
+
+    @classmethod
+    def from_db(cls, db: Session) -> "IntentMatcher":
+        drg_definitions = db.execute(text("SELECT DISTINCT ms_drg_definition FROM provider_pricing")).scalars().all()
+        cities = db.execute(text("SELECT DISTINCT provider_city FROM provider")).scalars().all()
+        return cls(drg_definitions, cities)
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        normalized = " ".join(question.lower().strip().rstrip("?.!").split())
+
+        match = CHEAPEST_PATTERN.match(normalized)
+        if match:
+            drg = self._match_drg(match.group("drg"))
+            if drg:
+                radius = float(match.group("radius")) if match.group("radius") else NEAR_RADIUS_KM
+                return IntentMatch("cheapest_near_zip", CHEAPEST_SQL, {
+                    "drg_definitions": drg,
+                    "zip_code": match.group("zip_code"),
+                    "zip_code_radius_km": radius
+                })
+
+        match = BEST_RATED_PATTERN.match(normalized)
+        if match:
+            location = self._match_location(match.group("location"))
+            if location:
+                location_filter, params = location
+                return IntentMatch("best_rated_in_location",
+                                   BEST_RATED_SQL.format(location_filter=location_filter), params)
+
+        match = AVERAGE_COST_PATTERN.match(normalized)
+        if match:
+            drg = self._match_drg(match.group("drg"))
+            location = self._match_location(match.group("location"))
+            if drg and location:
+                location_filter, params = location
+                params["drg_definitions"] = drg
+                return IntentMatch("average_cost_in_location",
+                                   AVERAGE_COST_SQL.format(location_filter=location_filter), params)
+
+        return None
+
+    def _match_drg(self, phrase: str) -> Optional[List[str]]:
+        """Return the DRG definitions containing every meaningful word of the phrase as a whole word
+
+        Stop words and words shorter than MIN_DRG_WORD_LENGTH are ignored and plural
+        words match their singular, "kidneys" matches "kidney".  A severity qualifier
+        such as "without cc/mcc" must equal the qualifier of the definition.  A phrase
+        without any meaningful word, or with an unclear qualifier, matches nothing.
+        """
+        qualifiers, rest = _split_qualifiers(phrase)
+        # A bare "mcc" or several qualifiers can't tell the with and without DRGs apart
+        if len(qualifiers) > 1 or DRG_SEVERITY_PATTERN.search(rest):
+            return None
+        qualifier = qualifiers[0] if qualifiers else None
+
+        words = [word for word in _drg_words(rest) if word not in DRG_STOP_WORDS]
+        if not words:
+            return None
+
+        matches = [
+            drg for drg, drg_qualifier, drg_words in self.drg_words
+            if (qualifier is None or drg_qualifier == qualifier) and all(word in drg_words for word in words)
+        ]
+        return matches or None
+
+    def _match_location(self, location: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Resolve a state name, state code or known city to a SQL filter and its params"""
+        location = location.strip()
+        if location in US_STATES:
+            return "p.provider_state = :location", {"location": US_STATES[location]}
+        if len(location) == 2 and location.upper() in US_STATES.values():
+            return "p.provider_state = :location", {"location": location.upper()}
+        if location in self.cities:
+            return "p.provider_city ILIKE :location", {"location": location}
+        return None
+
+def _split_qualifiers(phrase: str) -> Tuple[List[Tuple[str, str]], str]:
+    """Return the normalized severity qualifiers of a phrase and the phrase without them"""
+    qualifiers = []
+    for match in DRG_QUALIFIER_PATTERN.finditer(phrase.lower()):
+        negated = match.group(1) in ("without", "w/o")
+        severity = "cc/mcc" if match.group(2) == "cc or mcc" else match.group(2)
+        qualifiers.append(("without" if negated else "with", severity))
+    return qualifiers, DRG_QUALIFIER_PATTERN.sub(" ", phrase.lower())
+
+def _drg_words(phrase: str) -> List[str]:
+    """Lowercase singular words of a DRG definition or question phrase"""
+    words = []
+    for word in re.findall(r"[a-z0-9]+", phrase.lower()):
+        if len(word) < MIN_DRG_WORD_LENGTH:
+            continue
+        if word.endswith("s") and len(word) > 3:
+            word = word[:-1]
+        words.append(word)
+    return words
+
+class IntentStats:
+    """Counts template matches and the OpenAI latency they avoided"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.questions = 0
+        self.matched = 0
+        self.match_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    def record_match(self, matched: bool, seconds: float):
+        with self._lock:
+            self.questions += 1
+            self.match_seconds += seconds
+            if matched:
+                self.matched += 1
+
+    def record_llm_call(self, seconds: float):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            average_match_ms = self.match_seconds / self.questions * 1000 if self.questions else 0.0
+            average_llm_ms = self.llm_seconds / self.llm_calls * 1000 if self.llm_calls else None
+            return {
+                "questions": self.questions,
+                "matched": self.matched,
+                "match_rate": self.matched / self.questions if self.questions else 0.0,
+                "average_match_ms": average_match_ms,
+                "average_llm_ms": average_llm_ms,
+                # Estimated from the average latency of the questions that did go to OpenAI
+                "latency_saved_ms": (self.matched * (average_llm_ms - average_match_ms)
+                                     if average_llm_ms is not None else None),
+            }
+
+intent_stats = IntentStats()
+
+_matcher: Optional[IntentMatcher] = None
+_matcher_loaded_at = 0.0
+_matcher_lock = threading.Lock()
+
+def cached_intent_matcher() -> Optional[IntentMatcher]:
+    """Return the shared matcher without blocking, None when it is not loaded or its vocabulary is stale"""
+    matcher, loaded_at = _matcher, _matcher_loaded_at
+    if matcher is None or time.monotonic() - loaded_at > VOCABULARY_TTL_SECONDS:
+        return None
+    return matcher
+
+def get_intent_matcher(db: Session) -> IntentMatcher:
+    """Return the shared matcher, reloading its vocabulary every VOCABULARY_TTL_SECONDS
+
+    Blocks on the database while reloading, call it from a thread rather than the event loop.
+    """
+    global _matcher, _matcher_loaded_at
+    with _matcher_lock:
+        if _matcher is None or time.monotonic() - _matcher_loaded_at > VOCABULARY_TTL_SECONDS:
+            _matcher = IntentMatcher.from_db(db)
+            _matcher_loaded_at = time.monotonic()
+        return _matcher
@@ -1,9 +1,27 @@
 
 from openai import AsyncOpenAI
-import os
+import functools
+from typing import Optional, Tuple
+from ..config import settings
 
-aclient = AsyncOpenAI()
-from typing import Optional
+_client: Optional[AsyncOpenAI] = None
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared OpenAI client, constructing it on first use"""
+    global _client
+    if _client is None:
+        # settings also reads .env, which os.getenv does not
+        _client = AsyncOpenAI(api_key=settings.openai_api_key)
+    return _client
+
+@functools.lru_cache(maxsize=8)
+def _format_schemas_cached(schemas: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> str:
+    schema_text = ""
+    for table_name, columns in schemas:
+        schema_text += f"\nTable: {table_name}\n"
+        for column in columns:
+            schema_text += f"  - {column}\n"
+    return schema_text
 
 class OpenAIService:
 
@@ -33,8 +51,7 @@ class OpenAIService:
 
             Question: {natural_language}
             """
-            aclient.api_key=os.getenv("OPENAI_API_KEY")
-            response = await aclient.chat.completions.create(model="gpt-4.1-nano",
+            response = await get_client().chat.completions.create(model="gpt-4.1-nano",
             messages=[
                 {"role": "system", "content": "You are a SQL expert. Convert natural language to PostgreSQL queries."},
                 {"role": "user", "content": prompt}
@@ -61,21 +78,21 @@ class OpenAIService:
             return None
 
     def _format_schemas(self, schemas: dict) -> str:
-        """Format table schemas for OpenAI prompt"""
-        schema_text = ""
-        for table_name, columns in schemas.items():
-            schema_text += f"\nTable: {table_name}\n"
-            for column in columns:
-                schema_text += f"  - {column}\n"
-        return schema_text
+        """Format table schemas for OpenAI prompt, cached per distinct schema"""
+        return _format_schemas_cached(tuple((table_name, tuple(columns)) for table_name, columns in schemas.items()))
 
     def _validate_sql_response(self, sql_query: str) -> bool:
         """Validate that the response is a valid SQL query"""
         if not sql_query:
             return False
 
-        # Basic validation - starts with SELECT, INSERT, UPDATE, or DELETE
+        # Basic validation - only read queries, execution is also forced read-only
+        # by DatabaseService.execute_guarded_query
         sql_query = sql_query.upper().strip()
-        valid_starts = ['SELECT', 'INSERT', 'UPDATE', 'DELETE']
+        valid_starts = ['SELECT', 'WITH']
+
+        # A single statement only, EXPLAIN would check the first one while all of them run
+        if ";" in sql_query.rstrip(";").rstrip() or sql_query.count(";") > 1:
+            return False
 
         return any(sql_query.startswith(start) for start in valid_starts)
\ No newline at end of file
@@ -0,0 +1,121 @@
+import re
+import time
+
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, Any, List, Optional
+from ..config import settings
+
+NEIGHBOR_TABLE = "provider_zip_neighbor"
+CENTROID_BATCH_SIZE = 5000
+
+# Used when the stored neighbors don't cover the radius, zip codes without a centroid
+# fall back to a mocked distance in calculate_zip_distance
+SCAN_RADIUS_FILTER = "calculate_zip_distance(p.provider_zip_code, :zip_code) < :zip_code_radius_km"
+
+NEIGHBOR_RADIUS_FILTER = """p.provider_id IN (
+    SELECT n.provider_id FROM {table} n
+    WHERE n.zip_code = :zip_code and n.distance_km < :zip_code_radius_km
+)"""
+
+class ZipNeighborService:
+    """Precomputed K-nearest provider lists per zip code.
+
+    The provider_zip_neighbor table is rebuilt offline after import so that small
+    radius searches read at most K rows per zip code instead of computing the
+    distance from the requested zip code to every provider.  The K each table was
+    built with is recorded in zip_neighbor_build.
+    """
+
+    def __init__(self, db: Session, k: Optional[int] = None, table: str = NEIGHBOR_TABLE):
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", table):
+            raise ValueError(f"Invalid neighbor table name: {table}")
+        self.db = db
+        self.k = k or settings.zip_neighbor_k
+        self.table = table
+
+    def import_centroids(self, centroids: List[Dict[str, Any]]) -> int:
+        """Insert or update zip code centroids, each a dict of zip_code, latitude and longitude"""
+        for batch_start in range(0, len(centroids), CENTROID_BATCH_SIZE):
+            self.db.execute(text("""
+            INSERT INTO zip_code_centroid (zip_code, latitude, longitude)
+            VALUES (:zip_code, :latitude, :longitude)
+            ON CONFLICT (zip_code) DO UPDATE
+            SET latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude
+            """), centroids[batch_start:batch_start + CENTROID_BATCH_SIZE])
+        self.db.commit()
+        return len(centroids)
+
+    def precompute(self) -> Dict[str, Any]:
+        """Rebuild the neighbor table for every zip code in zip_code_centroid"""
+        start = time.perf_counter()
+
+        if self.table != NEIGHBOR_TABLE:
+            # Scratch tables, e.g. for benchmarks, never touch the live neighbor table
+            self.db.execute(text(f"CREATE TABLE IF NOT EXISTS {self.table} (LIKE {NEIGHBOR_TABLE} INCLUDING ALL)"))
+
+        self.db.execute(text(f"DELETE FROM {self.table}"))
+        self.db.execute(text(f"""
+        INSERT INTO {self.table} (zip_code, neighbor_rank, provider_id, distance_km)
+        SELECT z.zip_code, n.neighbor_rank, n.provider_id, n.distance_km
+        FROM zip_code_centroid z
+        CROSS JOIN LATERAL (
+            SELECT nearest.provider_id, nearest.distance_km,
+                   row_number() OVER (ORDER BY nearest.distance_km, nearest.provider_id) AS neighbor_rank
+            FROM (
+                SELECT p.provider_id,
+                       ST_DistanceSphere(
+                           ST_MakePoint(z.longitude, z.latitude),
+                           ST_MakePoint(c.longitude, c.latitude)
+                       ) / 1000.0 AS distance_km
+                FROM provider p
+                JOIN zip_code_centroid c ON c.zip_code = p.provider_zip_code
+                ORDER BY distance_km, p.provider_id
+                LIMIT :k
+            ) nearest
+        ) n
+        """), {"k": self.k})
+
+        # Recorded in the same transaction, so covers_radius always sees the K of the stored rows
+        self.db.execute(text("""
+        INSERT INTO zip_neighbor_build (table_name, k, built_at)
+        VALUES (:table_name, :k, now())
+        ON CONFLICT (table_name) DO UPDATE SET k = EXCLUDED.k, built_at = EXCLUDED.built_at
+        """), {"table_name": self.table, "k": self.k})
+        self.db.commit()
+
+        row_count = self.db.execute(text(f"SELECT count(*) FROM {self.table}")).scalar()
+        return {
+            "k": self.k,
+            "rows": row_count,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def covers_radius(self, zip_code: str, radius_km: float) -> bool:
+        """Check whether the stored neighbors of zip_code include every provider within radius_km
+
+        The list is complete for the radius when fewer than the K the table was built
+        with were stored (all reachable providers are present) or the K-th neighbor
+        lies at or beyond the radius.
+        """
+        result = self.db.execute(text(f"""
+        SELECT (SELECT k FROM zip_neighbor_build WHERE table_name = :table_name) AS built_k,
+               count(*) AS neighbor_count, max(distance_km) AS max_distance_km
+        FROM {self.table}
+        WHERE zip_code = :zip_code
+        """), {"table_name": self.table, "zip_code": zip_code}).first()
+
+        if result is None or result.built_k is None or not result.neighbor_count:
+            return False
+
+        return result.neighbor_count < result.built_k or result.max_distance_km >= radius_km
+
+    def radius_filter(self, zip_code: str, radius_km: float) -> str:
+        """SQL condition on provider p for providers within radius_km of zip_code
+
+        Uses the precomputed neighbors when they cover the radius and the full distance
+        scan otherwise.  Binds :zip_code and :zip_code_radius_km.
+        """
+        if self.covers_radius(zip_code, radius_km):
+            return NEIGHBOR_RADIUS_FILTER.format(table=self.table)
+        return SCAN_RADIUS_FILTER
@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from os.path import basename
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+from .config import settings
+
+class RequestTrace:
+    """Spans recorded for one request, only created when slow request tracing is enabled"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+    def summary(self, total_ms: float) -> str:
+        stages = {}
+        for name, duration_ms in self.spans:
+            stages[name] = stages.get(name, 0.0) + duration_ms
+        # Time outside any span, e.g. FastAPI validation and response serialization
+        stages["other"] = max(0.0, total_ms - sum(stages.values()))
+        parts = ", ".join(f"{name} {duration_ms:.1f}ms" for name, duration_ms in stages.items())
+        return f"Slow request {self.name} took {total_ms:.1f}ms: {parts}"
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.spans.append((self.name, (time.perf_counter() - self.started) * 1000))
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name: str):
+    """Time a stage of the current request, a shared no-op when tracing is disabled"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+async def trace_requests(request: Request, call_next):
+    """HTTP middleware, only installed when SLOW_REQUEST_MS is set, that logs traces of slow requests"""
+    trace = RequestTrace(f"{request.method} {request.url.path}")
+    token = _current_trace.set(trace)
+    try:
+        # Streaming responses are timed until their headers are sent
+        return await call_next(request)
+    finally:
+        _current_trace.reset(token)
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        if total_ms >= settings.slow_request_ms:
+            print(trace.summary(total_ms))
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """Sample the Python stacks of every other thread for a number of seconds
+
+    Returns collapsed stacks, one "thread;outer;...;inner count" line per distinct
+    stack, which flamegraph.pl and speedscope read directly.
+    """
+    own_thread = threading.get_ident()
+    counts = Counter()
+
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({basename(code.co_filename)})")
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            counts[";".join(reversed(stack))] += 1
+
+        time.sleep(interval)
+
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
@@ -0,0 +1,87 @@
+import argparse
+import csv
+import io
+import json
+import math
+import random
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.data_import_service import DataImportService, FIELD_MAPPINGS, TRUNCATED_NUMERIC_FIELDS
+
+def build_pricing_csv(rows: int) -> str:
+    """Synthetic CSV shaped like the CMS inpatient pricing file"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        "Rndrng_Prvdr_CCN", "Rndrng_Prvdr_Org_Name", "Rndrng_Prvdr_City", "Rndrng_Prvdr_St",
+        "Rndrng_Prvdr_State_Abrvtn", "Rndrng_Prvdr_Zip5", "DRG_Cd", "DRG_Desc", "Tot_Dschrgs",
+        "Avg_Submtd_Cvrd_Chrg", "Avg_Tot_Pymt_Amt", "Avg_Mdcr_Pymt_Amt"
+    ])
+    for i in range(rows):
+        writer.writerow([
+            10000 + i % 3000, f"Hospital {i % 3000}", "City", "1 Main St", "NY", f"{10000 + i % 900:05d}",
+            f"{i % 700:03d}", "HEART FAILURE AND SHOCK WITH MCC", random.randint(11, 500),
+            f"{random.uniform(1000, 500000):.2f}", f"{random.uniform(1000, 90000):.2f}",
+            f"{random.uniform(1000, 80000):.2f}"
+        ])
+    return output.getvalue()
+
+def build_rating_csv(rows: int) -> str:
+    """Synthetic CSV shaped like the CMS hospital general information file"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Facility ID", "Facility Name", "City/Town", "State", "ZIP Code", "Hospital overall rating"])
+    for i in range(rows):
+        rating = random.choice(["1", "2", "3", "4", "5", "Not Available"])
+        writer.writerow([10000 + i, f"Hospital {i}", "City", "NY", f"{10000 + i % 900:05d}", rating])
+    return output.getvalue()
+
+def row_by_row_transform(service: DataImportService, csv_content: str) -> str:
+    """The previous per-row transform, kept here as the benchmark baseline"""
+    json_objects = []
+    for row in csv.DictReader(io.StringIO(csv_content)):
+        if service._should_skip_row(row):
+            continue
+
+        mapped_row = {}
+        for original_key, value in row.items():
+            mapped_key = FIELD_MAPPINGS.get(original_key.lower(), original_key)
+            mapped_row[mapped_key] = value
+
+        for field in TRUNCATED_NUMERIC_FIELDS:
+            if field in mapped_row:
+                mapped_row[field] = math.trunc(float(mapped_row[field]))
+
+        json_objects.append(mapped_row)
+
+    return json.dumps(json_objects)
+
+def measure(label: str, transform, csv_content: str, repeat: int) -> float:
+    """Best CPU time in seconds over repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        transform(csv_content)
+        best = min(best, time.process_time() - start)
+    print(f"  {label}: {best:.3f}s CPU")
+    return best
+
+def benchmark(rows: int, repeat: int):
+    service = DataImportService()
+
+    for name, csv_content in (("pricing", build_pricing_csv(rows)), ("rating", build_rating_csv(rows))):
+        print(f"{name} CSV, {rows} rows:")
+        baseline = measure("row by row", lambda content: row_by_row_transform(service, content), csv_content, repeat)
+        vectorized = measure("vectorized", service._csv_to_json, csv_content, repeat)
+        print(f"  speedup: {baseline / vectorized:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CSV transform stage")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per transform, the best is reported")
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.repeat)
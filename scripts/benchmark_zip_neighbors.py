@@ -0,0 +1,89 @@
+import argparse
+import statistics
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.api.endpoints import PROVIDER_SEARCH_SQL
+from app.services.zip_neighbor_service import SCAN_RADIUS_FILTER, ZipNeighborService
+
+# Built with --k so benchmarking never replaces the neighbors /providers serves from
+SCRATCH_TABLE = "provider_zip_neighbor_benchmark"
+
+def time_query(db, query: str, params: dict, repeat: int) -> float:
+    """Median wall time in milliseconds for a query"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.execute(text(query), params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def benchmark(k: int, samples: int, radius_km: float, drg_description: str, repeat: int, skip_precompute: bool):
+    """Measure precompute cost, table size and radius query speedup"""
+    db = SessionLocal()
+    try:
+        if skip_precompute:
+            service = ZipNeighborService(db)
+        else:
+            service = ZipNeighborService(db, k=k, table=SCRATCH_TABLE)
+            stats = service.precompute()
+            print(f"Precompute into {SCRATCH_TABLE}: {stats['rows']} rows (k={stats['k']}) in {stats['seconds']:.2f}s")
+
+        size = db.execute(text(
+            "SELECT pg_total_relation_size(:table) AS bytes, "
+            "pg_size_pretty(pg_total_relation_size(:table)) AS pretty"
+        ), {"table": service.table}).first()
+        print(f"Table size: {size.pretty} ({size.bytes} bytes)")
+
+        zip_codes = [row[0] for row in db.execute(text(
+            "SELECT DISTINCT p.provider_zip_code FROM provider p "
+            "JOIN zip_code_centroid c ON c.zip_code = p.provider_zip_code "
+            "ORDER BY random() LIMIT :samples"
+        ), {"samples": samples})]
+
+        speedups = []
+        for zip_code in zip_codes:
+            params = {
+                "drg_description": f"%{drg_description}%",
+                "zip_code": zip_code,
+                "zip_code_radius_km": radius_km
+            }
+            if not service.covers_radius(zip_code, radius_km):
+                print(f"{zip_code}: radius {radius_km}km exceeds the precomputed list, skipped")
+                continue
+
+            # The same SQL /providers runs, with the scan and the neighbor filter it chooses between
+            full_scan_query = PROVIDER_SEARCH_SQL.format(radius_filter=SCAN_RADIUS_FILTER)
+            neighbor_query = PROVIDER_SEARCH_SQL.format(radius_filter=service.radius_filter(zip_code, radius_km))
+            full_ms = time_query(db, full_scan_query, params, repeat)
+            neighbor_ms = time_query(db, neighbor_query, params, repeat)
+            speedups.append(full_ms / neighbor_ms if neighbor_ms else float("inf"))
+            print(f"{zip_code}: full scan {full_ms:.2f}ms, neighbor table {neighbor_ms:.2f}ms")
+
+        if speedups:
+            print(f"Median speedup over {len(speedups)} zip codes: {statistics.median(speedups):.1f}x")
+
+        if not skip_precompute:
+            db.execute(text(f"DROP TABLE {SCRATCH_TABLE}"))
+            db.execute(text("DELETE FROM zip_neighbor_build WHERE table_name = :table"), {"table": SCRATCH_TABLE})
+            db.commit()
+
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the nearest-provider precompute")
+    parser.add_argument("--k", type=int, default=None, help="Providers stored per zip code")
+    parser.add_argument("--samples", type=int, default=20, help="Number of zip codes to query")
+    parser.add_argument("--radius-km", type=float, default=10.0)
+    parser.add_argument("--drg", default="heart", help="DRG description fragment")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query, median is reported")
+    parser.add_argument("--skip-precompute", action="store_true", help="Measure the live neighbor table as built instead of a scratch copy built with --k")
+    args = parser.parse_args()
+
+    benchmark(args.k, args.samples, args.radius_km, args.drg, args.repeat, args.skip_precompute)
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+DEFAULT_PATH = "/api/v1/providers?drg_description=heart&zip_code=10032&zip_code_radius_km=10"
+READY_TIMEOUT_SECONDS = 90
+
+async def run_load(base_url: str, path: str, concurrency: int, duration: float) -> dict:
+    """Send requests from concurrency clients for duration seconds"""
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+    }
+
+def wait_until_ready(base_url: str):
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{base_url} was not ready after {READY_TIMEOUT_SECONDS}s")
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    """Start uvicorn with the given number of workers, the pools are sized from WEB_CONCURRENCY"""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), WARM_UP_TIMEOUT_SECONDS="30")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env
+    )
+
+def print_result(label: str, result: dict, baseline_rps: float):
+    scaling = result["rps"] / baseline_rps if baseline_rps else 0.0
+    print(f"{label:>12}: {result['rps']:8.1f} req/s ({scaling:.2f}x), p50 {result['p50_ms']:.1f}ms, "
+          f"p95 {result['p95_ms']:.1f}ms, {result['requests']} ok, {result['errors']} errors")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API throughput across worker counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Worker counts to start locally and compare")
+    parser.add_argument("--url", help="Load an already running server instead of starting one")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per run")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    if args.url:
+        result = asyncio.run(run_load(args.url, args.path, args.concurrency, args.duration))
+        print_result(args.url, result, result["rps"])
+        return
+
+    print(f"{os.cpu_count()} cores, {args.concurrency} concurrent clients, {args.duration}s per run")
+    baseline_rps = 0.0
+    for workers in args.workers:
+        server = start_server(workers, args.port)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            wait_until_ready(base_url)
+            result = asyncio.run(run_load(base_url, args.path, args.concurrency, args.duration))
+            baseline_rps = baseline_rps or result["rps"]
+            print_result(f"{workers} workers", result, baseline_rps)
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
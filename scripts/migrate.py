@@ -0,0 +1,10 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import create_schema
+
+if __name__ == "__main__":
+    print("Creating database schema...")
+    create_schema()
+    print("Schema is up to date.")
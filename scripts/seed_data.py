@@ -1,15 +1,21 @@
 
+import argparse
 import asyncio
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import SessionLocal
-from app.services.data_import_service import DataImportService
+from app.services.data_import_service import DataImportService, peak_rss_mb
 from app.services.database_service import DatabaseService
+from app.services.zip_neighbor_service import ZipNeighborService
 
-async def seed_data():
-    """Seed the database with initial data"""
+# Census ZCTA gazetteer, one internal point per zip code tabulation area
+ZIP_CENTROIDS_URL = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2023_Gazetteer/2023_Gaz_zcta_national.zip"
+ZIP_CENTROIDS_FILE = "2023_Gaz_zcta_national.txt"
+
+async def seed_data(resume: bool = False):
+    """Seed the database with initial data, optionally resuming from the last checkpoint"""
 
     urls_to_process = [
         {
@@ -33,28 +39,66 @@ async def seed_data():
         import_service = DataImportService()
         db_service = DatabaseService(db)
 
+        failed_files = []
         for url_config in urls_to_process:
             print(f"Processing {url_config['url']}...")
 
-            json_data = import_service.fetch_and_process_file(
+            # Each file is imported before the next one is read
+            processed_files = import_service.fetch_and_process_file(
                 url=url_config["url"],
                 filename=url_config["filename"],
                 file_extension=url_config["file_extension"],
                 file_type=url_config["file_type"],
                 subfiles=url_config["subfiles"]
             )
-            if json_data:
-                print(f"Importing {len(json_data)} datasets...")
-                success = db_service.import_json_data(json_data)
+            imported = False
+            for processed in processed_files:
+                imported = True
+                if processed.records is None:
+                    failed_files.append(processed.file)
+                    continue
+
+                print(f"Importing {processed.rows} records of {processed.file}...")
+                # Checkpoints are keyed by source URL and file name
+                success = db_service.import_records(
+                    processed.records,
+                    processed.rows,
+                    source=url_config["url"],
+                    file=processed.file,
+                    resume=resume
+                )
                 if success:
-                    print("Data imported successfully!")
+                    print(f"{processed.file} imported successfully! Importer peak RSS {peak_rss_mb():.0f} MB")
                 else:
-                    print("Failed to import data.")
-            else:
+                    print(f"Failed to import {processed.file}.")
+                    failed_files.append(processed.file)
+
+            if not imported:
                 print("No data retrieved from URL.")
 
+        if failed_files:
+            print(f"Files not imported: {', '.join(failed_files)}")
+
+        neighbor_service = ZipNeighborService(db)
+
+        print(f"Processing {ZIP_CENTROIDS_URL}...")
+        centroids = import_service.fetch_zip_centroids(ZIP_CENTROIDS_URL, ZIP_CENTROIDS_FILE)
+        if centroids:
+            print(f"Imported {neighbor_service.import_centroids(centroids)} zip code centroids")
+        else:
+            print("No zip code centroids retrieved, distances stay mocked and the neighbor table empty.")
+
+        print("Precomputing nearest providers per zip code...")
+        stats = neighbor_service.precompute()
+        print(f"Stored {stats['rows']} neighbors (k={stats['k']}) in {stats['seconds']:.1f}s")
+
     finally:
         db.close()
 
 if __name__ == "__main__":
-    asyncio.run(seed_data())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed the database with CMS data")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue each file after its last committed batch instead of starting over")
+    args = parser.parse_args()
+
+    asyncio.run(seed_data(resume=args.resume))
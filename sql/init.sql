@@ -36,15 +36,59 @@ CREATE TABLE IF NOT EXISTS provider_rating (
     FOREIGN KEY (provider_id) REFERENCES provider(provider_id)
 );
 
+CREATE TABLE IF NOT EXISTS zip_code_centroid (
+    zip_code VARCHAR(20) PRIMARY KEY,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL
+);
+
+-- K nearest providers for every zip code in zip_code_centroid
+-- Rebuilt after import by ZipNeighborService.precompute
+CREATE TABLE IF NOT EXISTS provider_zip_neighbor (
+    zip_code VARCHAR(20) NOT NULL,
+    neighbor_rank SMALLINT NOT NULL,
+    provider_id VARCHAR(20) NOT NULL,
+    distance_km REAL NOT NULL,
+    PRIMARY KEY (zip_code, neighbor_rank),
+    FOREIGN KEY (provider_id) REFERENCES provider(provider_id)
+);
+
+-- K each neighbor table was last built with, written together with its rows
+CREATE TABLE IF NOT EXISTS zip_neighbor_build (
+    table_name VARCHAR(63) PRIMARY KEY,
+    k INT NOT NULL,
+    built_at TIMESTAMP DEFAULT now()
+);
+
+-- Rows of each source file committed by DatabaseService.import_json_data
+-- scripts/seed_data.py --resume continues from row_offset
+CREATE TABLE IF NOT EXISTS import_checkpoint (
+    source VARCHAR(1000) NOT NULL,
+    file VARCHAR(255) NOT NULL,
+    row_offset INT NOT NULL DEFAULT 0,
+    total_rows INT,
+    updated_at TIMESTAMP DEFAULT now(),
+    PRIMARY KEY (source, file)
+);
+
 -- Function to calculate distance between zip codes using PostGIS
 CREATE OR REPLACE FUNCTION calculate_zip_distance(zip1 TEXT, zip2 TEXT)
 RETURNS FLOAT AS $$
 DECLARE
     distance FLOAT;
 BEGIN
-    -- This is a simplified example - in production you'd need a zip code geocoding table
-    -- For now, we'll return a mock distance
-    SELECT RANDOM() * 100 INTO distance;
+    SELECT ST_DistanceSphere(
+               ST_MakePoint(a.longitude, a.latitude),
+               ST_MakePoint(b.longitude, b.latitude)
+           ) / 1000.0
+    INTO distance
+    FROM zip_code_centroid a, zip_code_centroid b
+    WHERE a.zip_code = zip1 AND b.zip_code = zip2;
+
+    -- Zip codes missing from zip_code_centroid fall back to a mock distance
+    IF distance IS NULL THEN
+        SELECT RANDOM() * 100 INTO distance;
+    END IF;
     RETURN distance;
 EXCEPTION
     WHEN OTHERS THEN
@@ -6,7 +6,7 @@ from fastapi.testclient import TestClient
 import os
 
 from app.main import app
-from app.database import get_db, Base
+from app.database import get_db, get_session_factory, Base
 from app.config import settings
 
 # Test database URL
@@ -15,6 +15,18 @@ TEST_DATABASE_URL = settings.test_database_url
 engine = create_engine(TEST_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+class NonClosingSession:
+    """Session proxy for endpoints that open and close their own session, the fixture session stays open"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
 @pytest.fixture(scope="session")
 def db_engine():
     """Create test database tables"""
@@ -45,5 +57,6 @@ def client(db_session):
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: (lambda: NonClosingSession(db_session))
     yield TestClient(app)
     app.dependency_overrides.clear()
\ No newline at end of file
@@ -1,4 +1,5 @@
 
+import json
 import pytest
 from fastapi.testclient import TestClient
 from app.models import Provider, ProviderPricing
@@ -15,6 +16,18 @@ def test_health_check(client: TestClient):
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
 
+def test_readiness_check(client: TestClient):
+    """Test readiness endpoint reports not ready until warm up has finished"""
+    client.app.state.ready = False
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+    client.app.state.ready = True
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
 def test_providers_endpoint_missing_params(client: TestClient):
     """Test providers endpoint with missing required parameters"""
     response = client.get("/api/v1/providers")
@@ -62,4 +75,103 @@ def test_ask_endpoint_missing_openai_key(client: TestClient):
         json={"question": "How many providers are there?"}
     )
     # This might return 500 due to missing API key, which is expected
-    assert response.status_code in [200, 500]
\ No newline at end of file
+    assert response.status_code in [200, 500]
+
+def test_ask_stats_endpoint(client: TestClient):
+    """Test fast path statistics are reported"""
+    response = client.get("/api/v1/ask/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert {"questions", "matched", "match_rate", "latency_saved_ms"} <= set(data)
+
+def test_ask_stream_endpoint(client: TestClient, db_session, monkeypatch):
+    """Test streamed answers with a stubbed LLM"""
+    from app.services.openai_service import OpenAIService
+
+    async def fake_convert_to_sql(self, natural_language, table_schemas):
+        return "SELECT provider_id, provider_name FROM provider ORDER BY provider_id"
+
+    monkeypatch.setattr(OpenAIService, "convert_to_sql", fake_convert_to_sql)
+
+    for provider_id in range(1, 13):
+        db_session.add(Provider(
+            provider_id=provider_id,
+            provider_name=f"Hospital {provider_id}",
+            provider_city="Test City",
+            provider_state="NY",
+            provider_zip_code="12345"
+        ))
+    db_session.commit()
+
+    response = client.post("/api/v1/ask/stream", json={"question": "List the hospitals"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+
+    assert events[0] == ("status", {"stage": "sql_generated"})
+    rows = [data["text"] for event, data in events if event == "row"]
+    assert len(rows) == 11
+    assert rows[0] == "1. {'provider_id': 1, 'provider_name': 'Hospital 1'}\n"
+    assert rows[-1] == "... and 2 more results."
+    assert events[-1] == ("done", {"total_rows": 12})
+
+def test_ask_stream_fetch_thread_owns_session(monkeypatch):
+    """Test a stopped stream lets the fetch thread finish before the session is closed"""
+    import queue
+    import threading
+    from unittest.mock import Mock
+    from app.api import endpoints
+
+    closed = []
+
+    def fake_stream_guarded_query(self, query, params=None, batch_size=100):
+        try:
+            for provider_id in range(10 * batch_size):
+                yield {"provider_id": provider_id}
+        finally:
+            closed.append("cursor")
+
+    monkeypatch.setattr(endpoints.DatabaseService, "stream_guarded_query", fake_stream_guarded_query)
+    db = Mock()
+    db.close.side_effect = lambda: closed.append("session")
+
+    batches = queue.Queue(maxsize=endpoints.STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+    producer = threading.Thread(target=endpoints._produce_batches, args=(db, "SELECT 1", {}, batches, stop))
+    producer.start()
+
+    assert len(batches.get(timeout=5)) == endpoints.STREAM_FETCH_SIZE
+    assert closed == []
+
+    # Client disconnected, the queue stays full and nobody reads it
+    stop.set()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    assert closed == ["cursor", "session"]
+
+def test_resolve_query_rolls_back_failed_match(monkeypatch):
+    """Test a failed vocabulary or coverage query is rolled back before falling back to OpenAI"""
+    import asyncio
+    from unittest.mock import Mock
+    from app.api import endpoints
+    from app.services.openai_service import OpenAIService
+
+    def failing_matcher(db):
+        raise RuntimeError("vocabulary query failed")
+
+    async def fake_convert_to_sql(self, natural_language, table_schemas):
+        return "SELECT provider_id FROM provider"
+
+    monkeypatch.setattr(endpoints, "cached_intent_matcher", lambda: None)
+    monkeypatch.setattr(endpoints, "get_intent_matcher", failing_matcher)
+    monkeypatch.setattr(OpenAIService, "convert_to_sql", fake_convert_to_sql)
+
+    db = Mock()
+    sql_query, params = asyncio.run(endpoints._resolve_query("Best rated hospital in Dothan", db))
+    assert sql_query == "SELECT provider_id FROM provider"
+    assert params == {}
+    db.rollback.assert_called_once()
@@ -72,3 +72,36 @@ def test_provider_rating_relationship(db_session):
     queried_provider = db_session.query(Provider).filter(Provider.provider_id == 1).first()
     assert len(queried_provider.rating) == 1
     assert queried_provider.rating[0].provider_overall_rating == 4
+
+def test_worker_connection_limit(monkeypatch):
+    """Test pool sizes are split across workers within the database connection limit"""
+    from app.config import settings
+    from app.database import worker_connection_limit
+
+    monkeypatch.setattr(settings, "db_max_connections", 100)
+    monkeypatch.setattr(settings, "db_reserved_connections", 10)
+    monkeypatch.setattr(settings, "web_concurrency", 4)
+    assert worker_connection_limit() == 22
+
+    monkeypatch.setattr(settings, "web_concurrency", 200)
+    assert worker_connection_limit() == 1
+
+def test_worker_pool_sizes(monkeypatch):
+    """Test a worker opens at most pool size plus max overflow, and never more than its share"""
+    from app.config import settings
+    from app.database import worker_pool_sizes
+
+    monkeypatch.setattr(settings, "db_max_connections", 100)
+    monkeypatch.setattr(settings, "db_reserved_connections", 10)
+    monkeypatch.setattr(settings, "db_pool_size", 5)
+    monkeypatch.setattr(settings, "db_max_overflow", 10)
+
+    # A single worker keeps the SQLAlchemy default of 5 + 10 instead of taking the whole share
+    monkeypatch.setattr(settings, "web_concurrency", 1)
+    assert worker_pool_sizes() == (5, 10)
+
+    monkeypatch.setattr(settings, "web_concurrency", 8)
+    assert worker_pool_sizes() == (5, 6)
+
+    monkeypatch.setattr(settings, "web_concurrency", 200)
+    assert worker_pool_sizes() == (1, 0)
@@ -1,9 +1,13 @@
 
 import pytest
 from unittest.mock import Mock, patch
+from sqlalchemy import text
 from app.services.database_service import DatabaseService
 from app.services.data_import_service import DataImportService
 from app.services.openai_service import OpenAIService
+from app.services.zip_neighbor_service import ZipNeighborService
+from app.services.intent_service import IntentMatcher
+from app.models import Provider, ZipCodeCentroid
 
 def test_database_service_execute_query(db_session):
     """Test database service query execution"""
@@ -15,6 +19,135 @@ def test_database_service_execute_query(db_session):
     assert len(result) == 1
     assert result[0]["test_value"] == 1
 
+def test_database_service_guarded_query(db_session, monkeypatch):
+    """Test generated SQL runs read-only and is rejected when the plan is too expensive"""
+    from app.config import settings
+    from app.services.database_service import QueryRejectedError
+    service = DatabaseService(db_session)
+
+    result = service.execute_guarded_query("SELECT 1 as test_value")
+    assert result == [{"test_value": 1}]
+
+    # Writes fail inside the read-only transaction
+    assert service.execute_guarded_query("DELETE FROM provider") is None
+    assert service.execute_safe_query("SELECT 1 as still_usable") == [{"still_usable": 1}]
+
+    monkeypatch.setattr(settings, "max_query_rows", 1000)
+    with pytest.raises(QueryRejectedError):
+        service.execute_guarded_query("SELECT * FROM generate_series(1, 1000000)")
+
+def test_database_service_import_resume(db_session):
+    """Test import checkpoints let a resumed load skip committed rows"""
+    import json
+    service = DatabaseService(db_session)
+    records = [
+        {"provider_id": 1, "provider_name": "Test Hospital", "provider_city": "Test City",
+         "provider_state": "NY", "provider_zip_code": "12345",
+         "ms_drg_definition": "Test DRG", "averaged_covered_charges": "100.5"},
+        {"provider_id": 1, "ms_drg_definition": "Other DRG", "averaged_covered_charges": 200},
+    ]
+
+    # First run stops after the first record
+    assert service.import_json_data([json.dumps(records[:1])], source="test", files=["pricing.csv"])
+    assert service._get_checkpoint("test", "pricing.csv") == 1
+
+    assert service.import_json_data([json.dumps(records)], source="test", files=["pricing.csv"],
+                                    batch_size=1, resume=True)
+    assert service._get_checkpoint("test", "pricing.csv") == 2
+
+    pricing = service.execute_safe_query(
+        "SELECT ms_drg_definition, averaged_covered_charges FROM provider_pricing ORDER BY ms_drg_definition"
+    )
+    assert pricing == [
+        {"ms_drg_definition": "Other DRG", "averaged_covered_charges": 200},
+        {"ms_drg_definition": "Test DRG", "averaged_covered_charges": 100},
+    ]
+
+def test_zip_neighbor_service_precompute(db_session):
+    """Test nearest-provider precompute and radius coverage"""
+    centroids = [
+        {"zip_code": "10032", "latitude": 40.8384, "longitude": -73.9428},
+        {"zip_code": "10001", "latitude": 40.7506, "longitude": -73.9972},
+        {"zip_code": "90001", "latitude": 33.9731, "longitude": -118.2479},
+    ]
+    service = ZipNeighborService(db_session, k=2)
+    assert service.import_centroids(centroids) == 3
+    assert db_session.query(ZipCodeCentroid).count() == 3
+
+    db_session.add_all([
+        Provider(provider_id=1, provider_name="Uptown Hospital", provider_city="New York",
+                 provider_state="NY", provider_zip_code="10032"),
+        Provider(provider_id=2, provider_name="Midtown Hospital", provider_city="New York",
+                 provider_state="NY", provider_zip_code="10001"),
+        Provider(provider_id=3, provider_name="LA Hospital", provider_city="Los Angeles",
+                 provider_state="CA", provider_zip_code="90001"),
+    ])
+    db_session.commit()
+
+    stats = service.precompute()
+    assert stats["rows"] == 6
+
+    neighbors = service.db.execute(text(
+        "SELECT provider_id, distance_km FROM provider_zip_neighbor "
+        "WHERE zip_code = '10032' ORDER BY neighbor_rank"
+    )).fetchall()
+    assert [row.provider_id for row in neighbors] == [1, 2]
+    assert 10 < neighbors[1].distance_km < 11
+
+    # Second neighbor is ~10.7km away, so only radii up to that are fully covered
+    assert service.covers_radius("10032", 5) == True
+    assert service.covers_radius("10032", 50) == False
+    assert service.covers_radius("99999", 5) == False
+
+    # Coverage follows the K the table was built with, not the configured one
+    assert ZipNeighborService(db_session, k=3).covers_radius("10032", 50) == False
+    assert "provider_zip_neighbor" in service.radius_filter("10032", 5)
+    assert "calculate_zip_distance" in service.radius_filter("10032", 50)
+
+def test_data_import_service_csv_headers():
+    """Test repeated headers keep the last column and ragged rows don't fail the file"""
+    import json
+
+    csv_content = """facility id,State,state,city/town
+1,NY,CA,Albany
+2,TX
+3,NV,AZ,Reno,extra"""
+
+    data = json.loads(DataImportService()._csv_to_json(csv_content))
+    assert data == [
+        {"provider_id": "1", "provider_state": "CA", "provider_city": "Albany"},
+        {"provider_id": "2", "provider_state": "", "provider_city": ""},
+    ]
+
+def test_data_import_service_zip_centroids(tmp_path):
+    """Test zip code centroids are read from the Census ZCTA gazetteer archive"""
+    import zipfile
+
+    # The real header pads its last column with trailing whitespace
+    gazetteer = (
+        "GEOID\tALAND\tAWATER\tALAND_SQMI\tAWATER_SQMI\tINTPTLAT\tINTPTLONG             \n"
+        "10032\t1748741\t0\t0.675\t0.000\t40.838400\t-73.942800\n"
+        "90001\t9071359\t0\t3.502\t0.000\t33.973100\t-118.247900\n"
+    )
+    zip_path = tmp_path / "gazetteer.zip"
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        zip_file.writestr("2023_Gaz_zcta_national.txt", gazetteer)
+
+    response = Mock()
+    response.__enter__ = Mock(return_value=response)
+    response.__exit__ = Mock(return_value=False)
+    response.iter_content.return_value = [zip_path.read_bytes()]
+
+    service = DataImportService()
+    with patch("app.services.data_import_service.requests.get", return_value=response):
+        centroids = service.fetch_zip_centroids("https://example.com/gazetteer.zip", "2023_Gaz_zcta_national.txt")
+        assert service.fetch_zip_centroids("https://example.com/gazetteer.zip", "Missing.txt") == []
+
+    assert centroids == [
+        {"zip_code": "10032", "latitude": 40.8384, "longitude": -73.9428},
+        {"zip_code": "90001", "latitude": 33.9731, "longitude": -118.2479},
+    ]
+
 def test_data_import_service_csv_conversion():
     """Test CSV to JSON conversion"""
     service = DataImportService()
@@ -32,6 +165,77 @@ def test_data_import_service_csv_conversion():
     assert data[0]["provider_id"] == "1"
     assert data[0]["provider_name"] == "Test Hospital"
 
+def test_data_import_service_csv_transform_rules():
+    """Test vectorized skip rules and numeric truncation"""
+    service = DataImportService()
+
+    csv_content = """Rndrng_Prvdr_CCN,DRG_Desc,Avg_Submtd_Cvrd_Chrg,Hospital overall rating
+1,HEART FAILURE,12345.99,4
+2,HEART FAILURE,500.10,Not Available
+3,KIDNEY FAILURE,not a number,"""
+
+    import json
+    data = json.loads(service._csv_to_json(csv_content))
+    assert [row["provider_id"] for row in data] == ["1", "3"]
+    assert data[0]["averaged_covered_charges"] == 12345
+    assert data[1]["averaged_covered_charges"] == "not a number"
+
+    # Non-finite and out of range amounts stay strings instead of failing the file
+    data = json.loads(service._csv_to_json(
+        "Rndrng_Prvdr_CCN,Avg_Submtd_Cvrd_Chrg\n1,inf\n2,1e30\n3,-12.7\n"
+    ))
+    assert [row["averaged_covered_charges"] for row in data] == ["inf", "1e30", -12]
+
+def test_data_import_service_zip_processing(tmp_path):
+    """Test ZIP members are yielded in subfiles order and failures reported per member"""
+    import json
+    import zipfile
+
+    zip_path = tmp_path / "hospitals.zip"
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        zip_file.writestr("General.csv", "facility id,facility name\n1,Test Hospital\n")
+        zip_file.writestr("Ratings.csv", "facility id,hospital overall rating\n1,4\n2,5\n")
+        zip_file.writestr("Broken.csv", b"facility id\n\xff\xfe\n")
+        zip_file.writestr("README.txt", "not data")
+
+    service = DataImportService()
+    results = service._process_zip_file(
+        str(zip_path), ["Ratings.csv", "Broken.csv", "General.csv", "README.txt", "Missing.csv"]
+    )
+
+    # Records are read lazily from JSON Lines, each file before the next one is yielded
+    ratings = next(results)
+    assert (ratings.file, ratings.rows) == ("Ratings.csv", 2)
+    assert [row["provider_overall_rating"] for row in ratings.records] == ["4", "5"]
+
+    broken = next(results)
+    assert (broken.file, broken.records) == ("Broken.csv", None)
+
+    general = next(results)
+    assert general.file == "General.csv"
+    assert next(general.records)["provider_name"] == "Test Hospital"
+
+    missing = next(results)
+    assert (missing.file, missing.records) == ("Missing.csv", None)
+    assert list(results) == []
+
+def test_data_import_service_csv_download(tmp_path):
+    """Test a downloaded CSV is yielded as lazily read records"""
+    response = Mock()
+    response.__enter__ = Mock(return_value=response)
+    response.__exit__ = Mock(return_value=False)
+    response.iter_content.return_value = [b"facility id,facility name\n", b"1,Test Hospital\n2,Other Hospital\n"]
+
+    service = DataImportService()
+    with patch("app.services.data_import_service.requests.get", return_value=response):
+        # The temporary records file lives until the generator moves on
+        processed_files = service.fetch_and_process_file(
+            "https://example.com/providers.csv", "providers.csv", "CSV", "CSV"
+        )
+        processed = next(processed_files)
+        assert (processed.file, processed.rows) == ("providers.csv", 2)
+        assert [row["provider_name"] for row in processed.records] == ["Test Hospital", "Other Hospital"]
+
 def test_data_import_service_skip_rows():
     """Test row skipping logic"""
     service = DataImportService()
@@ -52,6 +256,97 @@ def test_data_import_service_skip_rows():
     }
     assert service._should_skip_row(row2) == False
 
+def test_openai_service_rejects_write_sql():
+    """Test only read queries are accepted from the model"""
+    service = OpenAIService()
+
+    assert service._validate_sql_response("SELECT * FROM provider") == True
+    assert service._validate_sql_response("with t as (select 1) select * from t") == True
+    assert service._validate_sql_response("DELETE FROM provider") == False
+    assert service._validate_sql_response("UPDATE provider SET provider_name = 'x'") == False
+    assert service._validate_sql_response("SELECT * FROM provider;") == True
+    assert service._validate_sql_response(
+        "SELECT 1; SELECT * FROM provider_pricing a, provider_pricing b"
+    ) == False
+    assert service._validate_sql_response("SELECT 1;;") == False
+
+def test_database_service_rejects_multiple_statements():
+    """Test guarded queries never reach EXPLAIN with more than one statement"""
+    from app.services.database_service import single_statement
+
+    db = Mock()
+    service = DatabaseService(db)
+    assert service.execute_guarded_query("SELECT 1; SELECT * FROM provider_pricing a, provider_pricing b") is None
+    with pytest.raises(ValueError):
+        next(service.stream_guarded_query("SELECT 1; DELETE FROM provider"))
+    db.execute.assert_not_called()
+    db.begin_nested.assert_not_called()
+
+    assert single_statement(" SELECT 1 ; ") == "SELECT 1"
+
+def test_openai_client_uses_settings_key(monkeypatch):
+    """Test the client takes the key from settings, which include .env, not only the environment"""
+    from app.config import settings
+    from app.services import openai_service
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(settings, "openai_api_key", "sk-from-dotenv")
+    monkeypatch.setattr(openai_service, "_client", None)
+    assert openai_service.get_client().api_key == "sk-from-dotenv"
+
+def test_intent_matcher_templates():
+    """Test common question templates are matched locally and others fall back"""
+    matcher = IntentMatcher(
+        ["291-HEART FAILURE AND SHOCK WITH MCC", "293-HEART FAILURE AND SHOCK WITHOUT CC/MCC",
+         "470-MAJOR HIP AND KNEE JOINT REPLACEMENT",
+         "690-KIDNEY & URINARY TRACT INFECTIONS"],
+        ["Dothan"]
+    )
+
+    match = matcher.match("Who is cheapest for kidneys within 11km of 36301?")
+    assert match.intent == "cheapest_near_zip"
+    assert match.params == {"drg_definitions": ["690-KIDNEY & URINARY TRACT INFECTIONS"],
+                            "zip_code": "36301", "zip_code_radius_km": 11.0}
+
+    match = matcher.match("Which hospital is cheapest for heart failure near 10032")
+    assert match.params["zip_code_radius_km"] == 25
+
+    # The radius is served from the precomputed neighbors only when they cover it
+    db = Mock()
+    with patch.object(ZipNeighborService, "covers_radius", return_value=True):
+        assert "provider_zip_neighbor" in match.resolve_sql(db)
+    with patch.object(ZipNeighborService, "covers_radius", return_value=False):
+        assert "calculate_zip_distance" in match.resolve_sql(db)
+
+    match = matcher.match("Best rated hospital in Dothan?")
+    assert match.intent == "best_rated_in_location"
+    assert match.params == {"location": "dothan"}
+
+    match = matcher.match("What is the average cost of knee replacement in New York?")
+    assert match.intent == "average_cost_in_location"
+    assert match.params == {"location": "NY", "drg_definitions": ["470-MAJOR HIP AND KNEE JOINT REPLACEMENT"]}
+
+    # DRG words must match whole words, and stop words or short words alone match nothing
+    assert matcher.match("Who is cheapest for a near 10032") is None
+    assert matcher.match("Who is cheapest for the procedure near 10032") is None
+    assert matcher.match("Who is cheapest for art near 10032") is None
+    assert matcher.match("Who is cheapest for replacement of knee near 10032").intent == "cheapest_near_zip"
+
+    # Severity qualifiers pick between DRGs of the same condition and must match exactly
+    match = matcher.match("Who is cheapest for heart failure without cc/mcc near 10032")
+    assert match.params["drg_definitions"] == ["293-HEART FAILURE AND SHOCK WITHOUT CC/MCC"]
+    match = matcher.match("Who is cheapest for heart failure with mcc near 10032")
+    assert match.params["drg_definitions"] == ["291-HEART FAILURE AND SHOCK WITH MCC"]
+    match = matcher.match("Who is cheapest for heart failure near 10032")
+    assert len(match.params["drg_definitions"]) == 2
+    assert matcher.match("Who is cheapest for heart failure without mcc near 10032") is None
+    assert matcher.match("Who is cheapest for heart failure mcc near 10032") is None
+
+    # Unknown DRG, unknown location and other shapes go to OpenAI
+    assert matcher.match("What is the average cost of spine surgery in NY?") is None
+    assert matcher.match("Best rated hospital in Atlantis") is None
+    assert matcher.match("How many providers do kidneys within 11km of 36301?") is None
+
 @patch('openai.resources.chat.Completions.acreate')
 def test_openai_service_sql_conversion(mock_openai):
     """Test OpenAI service SQL conversion"""
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from app import tracing
+from app.config import settings
+
+def test_span_is_noop_without_trace():
+    """Test spans record nothing when tracing is disabled"""
+    with tracing.span("sql") as recorded:
+        pass
+    assert recorded is tracing._NULL_SPAN
+
+def test_span_records_stages():
+    """Test spans are recorded on the current request trace"""
+    trace = tracing.RequestTrace("GET /api/v1/providers")
+    token = tracing._current_trace.set(trace)
+    try:
+        with tracing.span("sql"):
+            time.sleep(0.01)
+        with tracing.span("pydantic"):
+            pass
+    finally:
+        tracing._current_trace.reset(token)
+
+    assert [name for name, _ in trace.spans] == ["sql", "pydantic"]
+    assert trace.spans[0][1] >= 10
+
+    summary = trace.summary(50.0)
+    assert summary.startswith("Slow request GET /api/v1/providers took 50.0ms: sql ")
+    assert "other" in summary
+
+def test_sample_stacks_collapsed_output():
+    """Test the sampler returns collapsed stacks of other threads"""
+    stop = threading.Event()
+
+    def busy_wait():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_wait, name="busy-worker")
+    worker.start()
+    try:
+        profile = tracing.sample_stacks(0.1, interval=0.001)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = profile.strip().split("\n")
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy
+    stack, count = busy[0].rsplit(" ", 1)
+    assert "busy_wait (test_tracing.py)" in stack
+    assert int(count) > 0
+
+def test_admin_profile_requires_token(client: TestClient, monkeypatch):
+    """Test the profiler endpoint is disabled without a token and checks it otherwise"""
+    monkeypatch.setattr(settings, "admin_token", "")
+    assert client.post("/api/v1/admin/profile", params={"seconds": 0.05}).status_code == 404
+
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    response = client.post("/api/v1/admin/profile", params={"seconds": 0.05},
+                           headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+
+    response = client.post("/api/v1/admin/profile", params={"seconds": 0.05},
+                           headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")